@@ -1,7 +1,9 @@
 from fastapi import APIRouter
-from .endpoints import files, report # analysis から files に変更
+from .endpoints import files, report, jobs, results # analysis から files に変更
 
 api_router = APIRouter()
 # prefixを/filesに変更し、新しいルーターを登録
 api_router.include_router(files.router, prefix="/files", tags=["File Analysis"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["Analysis Jobs"])
+api_router.include_router(results.router, prefix="/results", tags=["Analysis Results"])
 api_router.include_router(report.router, prefix="/report", tags=["Report Generation"])
\ No newline at end of file
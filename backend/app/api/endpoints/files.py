@@ -3,75 +3,229 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from pydantic import BaseModel
 import uuid
+import zipfile
+from contextlib import ExitStack
 from pathlib import Path
-from typing import List, Any, Dict
-from app.services import analysis_service
-import csv
+from typing import IO, List, Any, Dict, Optional
+from app.core import metrics
+from app.services import analysis_service, batch_service
+from app.services.job_service import job_manager
+from app.services.results_service import result_store
+from app.services.upload_service import upload_store
 
 router = APIRouter()
-TEMP_DIR = Path("temp_files")
-TEMP_DIR.mkdir(exist_ok=True)
 
 class UploadResponse(BaseModel):
     file_id: str
     headers: List[str]
     total_rows: int
+    # 同じ内容のファイルがすでにアップロードされていて、それを再利用した場合は True
+    reused: bool = False
 
 class AnalyzeRequest(BaseModel):
     file_id: str
-    column_name: str
+    column_name: Optional[str] = None
+    # 複数の自由記述列をまとめて分析する場合の列名のリスト（column_name の代わりに指定する）
+    column_names: List[str] = []
     batch_size: int = 50
+    # 差分分析: 指定した既存の分析結果（resultId）を、このファイルの内容で更新する
+    base_result_id: Optional[str] = None
+    # 行を識別する列（回答IDなど）。省略時は本文のハッシュで行を識別する
+    row_key_column: Optional[str] = None
+
+class ZipUploadedFile(UploadResponse):
+    filename: str
+
+class ZipUploadResponse(BaseModel):
+    files: List[ZipUploadedFile]
+    # 読み込めなかったCSV（ファイル名 → 理由）
+    skipped: Dict[str, str]
+
+def _ingest_csv(stream: IO[bytes], filename: str) -> Dict[str, Any]:
+    """
+    CSVをアップロードストアに保存し、文字コード判定・ヘッダー取得・行数カウントを行う。
+    同じ内容のファイルがすでにあれば、解析し直さずにその file_id とファイル情報を返す。
+    """
+    with metrics.span("ingest_upload"):
+        file_id, file_info, reused = upload_store.store(stream, filename)
+    return {
+        "file_id": file_id, "filename": filename, "headers": file_info["headers"],
+        "total_rows": file_info["total_rows"], "reused": reused,
+    }
+
+def _ingest_error_detail(e: Exception) -> str:
+    return str(e) if isinstance(e, ValueError) else f"CSVの解析に失敗しました: {e}"
 
 @router.post("/upload", response_model=UploadResponse)
-async def upload_csv_for_preview(file: UploadFile = File(...)):
+def upload_csv_for_preview(file: UploadFile = File(...)):
+    """
+    CSVをアップロードし、ヘッダーと行数を返す。
+    判定したファイル情報は file_id と一緒に保存され、分析時に再利用される。
+    アップロードは最後に使われてから UPLOAD_TTL_SECONDS の間、または容量の上限に達して古いものから削除されるまで保持する。
+    """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="CSVファイルをアップロードしてください。")
-    file_id = str(uuid.uuid4())
-    file_path = TEMP_DIR / f"{file_id}.csv"
-    file_content = await file.read()
-    with open(file_path, "wb") as buffer:
-        buffer.write(file_content)
-
-    encodings_to_try = ['utf-8-sig', 'utf-8', 'cp932', 'shift_jis']
-    decoded_content = None
-    for encoding in encodings_to_try:
-        try:
-            decoded_content = file_content.decode(encoding)
-            print(f"Successfully decoded upload preview with encoding: '{encoding}'")
-            break
-        except UnicodeDecodeError:
-            continue
-    if decoded_content is None:
-        raise HTTPException(status_code=400, detail="サポートされている文字コードでファイルを読み込めませんでした。")
-
-    headers, total_rows = [], 0
     try:
-        lines = decoded_content.splitlines()
-        if lines:
-            reader = csv.reader(lines)
-            headers = next(reader)
-            total_rows = sum(1 for row in reader if any(field.strip() for field in row))
+        return _ingest_csv(file.file, file.filename)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"CSVの解析に失敗しました: {e}")
-    return {"file_id": file_id, "headers": headers, "total_rows": total_rows}
+        raise HTTPException(status_code=400, detail=_ingest_error_detail(e))
+
+def _zip_member_name(info: zipfile.ZipInfo) -> str:
+    """
+    ZIP内のファイル名を返す。Windowsで作られたZIPはファイル名がCP932のままで UTF-8 フラグが立っていないため、
+    CP437として読まれた名前を元のバイト列に戻してCP932で読み直す。
+    """
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("cp932")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return info.filename
+
+@router.post("/upload-zip", response_model=ZipUploadResponse)
+def upload_zip_of_csvs(file: UploadFile = File(...)):
+    """
+    複数のCSVをまとめたZIPをアップロードし、含まれるCSVをそれぞれ1つのアップロードとして保存する。
+    返された file_id と列名の組を /files/analyze-batch に渡すと一括で分析できる。
+    """
+    if not file.filename.endswith('.zip'):
+        raise HTTPException(status_code=400, detail="ZIPファイルをアップロードしてください。")
+    try:
+        archive = zipfile.ZipFile(file.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="ZIPファイルを読み込めませんでした。")
+    files, skipped = [], {}
+    with archive:
+        for info in archive.infolist():
+            name = _zip_member_name(info)
+            # フォルダと、macOS が付け加えるメタデータは対象外
+            if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(".csv"):
+                continue
+            try:
+                with archive.open(info) as member:
+                    files.append(_ingest_csv(member, Path(name).name))
+            except Exception as e:
+                skipped[name] = _ingest_error_detail(e)
+    if not files:
+        raise HTTPException(status_code=400, detail="ZIPファイルに読み込めるCSVが含まれていません。")
+    return {"files": files, "skipped": skipped}
 
 
-# ↓↓↓ レスポンスの型を、複雑なダッシュボードデータ(Dict)を返すように変更 ↓↓↓
-@router.post("/analyze", response_model=Dict[str, Any])
+class AnalyzeJobResponse(BaseModel):
+    job_id: str
+    status: str
+
+@router.post("/analyze", response_model=AnalyzeJobResponse, status_code=202)
 async def analyze_uploaded_file(request: AnalyzeRequest):
-    """ファイルID、列名、バッチサイズを使って分析を実行し、ダッシュボードデータを返す"""
-    file_path = TEMP_DIR / f"{request.file_id}.csv"
-    if not file_path.exists():
+    """
+    分析ジョブを登録してジョブIDをすぐに返す。
+    分析本体はワーカーで実行され、進捗と結果は /jobs エンドポイントで取得する。
+    途中経過はチェックポイントとして保存され、失敗・キャンセル後に同じ条件で再実行すると続きから処理する。
+    base_result_id を指定すると、前回の分析から追加・変更された行だけを分析して、その結果を更新する。
+    column_names に複数の列を指定すると、1回の読み込みと共有のLLMバッチで全列を分析し、
+    列ごとのダッシュボード（"columns"）と全列を合わせたダッシュボード（"combined"）を返す。
+    """
+    file_info = upload_store.get(request.file_id)
+    if file_info is None:
         raise HTTPException(status_code=404, detail="指定されたファイルが見つかりません。再度アップロードしてください。")
+    column_names = list(dict.fromkeys(request.column_names or ([request.column_name] if request.column_name else [])))
+    if not column_names:
+        raise HTTPException(status_code=400, detail="分析する列を指定してください。")
+    for column_name in column_names:
+        if column_name not in file_info["headers"]:
+            raise HTTPException(status_code=400, detail=f"指定された列'{column_name}'がCSVに見つかりません。")
+    multi_column = len(column_names) > 1
+    if multi_column and request.base_result_id is not None:
+        raise HTTPException(status_code=400, detail="差分分析は1つの列を分析する場合のみ利用できます。")
 
-    try:
-        # ↓↓↓ analysis_service の正しい関数を呼び出すように変更 ↓↓↓
-        results = analysis_service.analyze_comments_from_file(
-            file_path, request.column_name, request.batch_size
-        )
-        file_path.unlink()
+    if request.base_result_id is not None:
+        run_info = result_store.run_info(request.base_result_id)
+        if run_info is None:
+            raise HTTPException(status_code=404, detail="差分の基準となる分析結果が見つかりません。")
+        if run_info["row_key_column"] != request.row_key_column:
+            raise HTTPException(
+                status_code=400,
+                detail=f"行キーの列が前回の分析（{run_info['row_key_column'] or '本文のハッシュ'}）と異なります。",
+            )
+
+    journal = analysis_service.journal_for_run(
+        request.file_id, column_names if multi_column else column_names[0], request.batch_size,
+    )
+
+    def run_analysis(job):
+        # 分析中のファイルはアップロードストアの掃除で削除されない
+        with upload_store.lease(request.file_id) as file_path:
+            if multi_column:
+                results = analysis_service.analyze_columns_from_file(
+                    file_path, column_names, request.batch_size,
+                    progress_callback=job.report_progress, cancel_event=job.cancel_event, journal=journal,
+                    result_id=job.id, row_key_column=request.row_key_column,
+                )
+            else:
+                results = analysis_service.analyze_comments_from_file(
+                    file_path, column_names[0], request.batch_size,
+                    progress_callback=job.report_progress, cancel_event=job.cancel_event, journal=journal,
+                    result_id=request.base_result_id or job.id, incremental=request.base_result_id is not None,
+                    row_key_column=request.row_key_column,
+                )
+        journal.discard()
         return results
-    except Exception as e:
-        if file_path.exists():
-            file_path.unlink()
-        raise HTTPException(status_code=500, detail=f"分析中にエラーが発生しました: {str(e)}")
\ No newline at end of file
+
+    job = job_manager.submit(run_analysis, request.model_dump())
+    return {"job_id": job.id, "status": job.status}
+
+
+class BatchFile(BaseModel):
+    file_id: str
+    column_name: str
+    # 比較表での表示名（科目名など）。省略時はアップロード時のファイル名
+    label: Optional[str] = None
+
+class BatchAnalyzeRequest(BaseModel):
+    files: List[BatchFile]
+    batch_size: int = 50
+
+@router.post("/analyze-batch", response_model=AnalyzeJobResponse, status_code=202)
+async def analyze_uploaded_files(request: BatchAnalyzeRequest):
+    """
+    複数のファイル（学期の全科目など）を1つのジョブとして分析する。
+    各ファイルのLLMバッチは共有のスケジューラでファイル間を順番に回りながら処理されるため、
+    大きなファイルが他のファイルを待たせ続けることはない。
+    ジョブの結果は科目ごとのダッシュボード（"courses"）と、感情・カテゴリの割合の比較表（"comparison"）。
+    """
+    if not request.files:
+        raise HTTPException(status_code=400, detail="分析するファイルを指定してください。")
+    items = []
+    for entry in request.files:
+        file_info = upload_store.get(entry.file_id)
+        if file_info is None:
+            raise HTTPException(status_code=404, detail=f"ファイル {entry.file_id} が見つかりません。再度アップロードしてください。")
+        label = entry.label or Path(file_info.get("filename") or entry.file_id).stem
+        if entry.column_name not in file_info["headers"]:
+            raise HTTPException(status_code=400, detail=f"'{label}' に列 '{entry.column_name}' がありません。")
+        items.append(batch_service.BatchItem(
+            label, entry.file_id, upload_store.path_for(entry.file_id), entry.column_name, str(uuid.uuid4()),
+            analysis_service.journal_for_run(entry.file_id, entry.column_name, request.batch_size),
+        ))
+
+    def run_batch(job):
+        with ExitStack() as leases:
+            for file_id in {item.file_id for item in items}:
+                leases.enter_context(upload_store.lease(file_id))
+            results = batch_service.analyze_files(
+                items, request.batch_size, progress_callback=job.report_progress, cancel_event=job.cancel_event,
+            )
+        for item, course in zip(items, results["courses"]):
+            if course["error"] is None:
+                item.journal.discard()
+        return results
+
+    job = job_manager.submit(run_batch, request.model_dump())
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.delete("/{file_id}", status_code=204)
+async def discard_uploaded_file(file_id: str):
+    """不要になったアップロードを、途中経過ごと破棄する"""
+    if not upload_store.delete(file_id):
+        raise HTTPException(status_code=404, detail="指定されたファイルが見つかりません。")
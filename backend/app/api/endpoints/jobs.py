@@ -0,0 +1,77 @@
+# backend/app/api/endpoints/jobs.py
+
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from app.services.job_service import job_manager, Job, COMPLETED, TERMINAL_STATUSES
+
+router = APIRouter()
+
+# SSE で状態の変化を確認する間隔（秒）
+SSE_POLL_INTERVAL = 0.5
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    batches_completed: int
+    batches_total: int
+    eta_seconds: Optional[float] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+def _get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="指定されたジョブが見つかりません。")
+    return job
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """ジョブの状態・完了バッチ数・残り時間の目安を返す"""
+    return _get_job_or_404(job_id).to_dict()
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """ジョブの進捗を Server-Sent Events で配信する。ジョブが終了するとストリームも終わる"""
+    job = _get_job_or_404(job_id)
+
+    async def event_stream():
+        last_version = -1
+        while True:
+            if job.version != last_version:
+                last_version = job.version
+                status = job.to_dict()
+                finished = status["status"] in TERMINAL_STATUSES
+                event = status["status"] if finished else "progress"
+                yield f"event: {event}\ndata: {json.dumps(status)}\n\n"
+                if finished:
+                    return
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/{job_id}/result", response_model=Dict[str, Any])
+async def get_job_result(job_id: str):
+    """完了したジョブのダッシュボードデータを返す"""
+    job = _get_job_or_404(job_id)
+    if job.status != COMPLETED:
+        detail = job.error or f"ジョブはまだ完了していません（状態: {job.status}）。"
+        raise HTTPException(status_code=409, detail=detail)
+    return job.result
+
+@router.post("/{job_id}/cancel", response_model=JobStatusResponse)
+async def cancel_job(job_id: str):
+    """実行中・待機中のジョブをキャンセルする"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="指定されたジョブが見つかりません。")
+    return job.to_dict()
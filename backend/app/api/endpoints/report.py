@@ -1,30 +1,90 @@
 # backend/app/api/endpoints/report.py
 
+import json
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Any, Dict, List
-from app.services import llm_service
+from typing import Any, Dict, List, Optional
+from app.services import report_service
+from app.services.job_service import job_manager, COMPLETED
 
 router = APIRouter()
 
-# フロントエンドから受け取るダッシュボードデータの型を定義
-class DashboardData(BaseModel):
-    summary: Dict[str, Any]
-    categoryDistribution: Dict[str, Any]
-    topPositiveThemes: List[Any]
-    topNegativeThemes: List[Any]
-    criticalComments: List[Any]
-    topRankedComments: List[Any]
+# レポート生成のリクエスト。分析ジョブのIDだけを送れば、サーバー側に保持している結果を使う。
+# ダッシュボードデータを直接送る場合も、プロンプトに使う件数とテーマ名以外は不要
+class ReportRequest(BaseModel):
+    job_id: Optional[str] = None
+    summary: Optional[Dict[str, Any]] = None
+    topPositiveThemes: List[Any] = []
+    topNegativeThemes: List[Any] = []
 
 class ReportResponse(BaseModel):
     report_text: str
+    cached: bool = False
+
+def _resolve_dashboard(request: ReportRequest) -> Dict[str, Any]:
+    """リクエストからレポートの元になるダッシュボードデータを取り出す。"""
+    if request.job_id is not None:
+        job = job_manager.get(request.job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="指定されたジョブが見つかりません。")
+        if job.status != COMPLETED:
+            raise HTTPException(status_code=409, detail=f"ジョブはまだ完了していません（状態: {job.status}）。")
+        if "combined" in job.result:
+            # 複数の列を分析したジョブは、全列を合わせたダッシュボードからレポートを作る
+            return job.result["combined"]
+        if "summary" not in job.result:
+            # 一括分析のジョブは科目ごとのダッシュボードを持つので、対象の科目のデータを直接送ってもらう
+            raise HTTPException(status_code=422, detail="一括分析のジョブでは、科目のダッシュボードデータを指定してください。")
+        return job.result
+    if request.summary is None:
+        raise HTTPException(status_code=422, detail="job_id またはダッシュボードデータを指定してください。")
+    return request.model_dump(exclude={"job_id"})
 
 @router.post("/generate", response_model=ReportResponse)
-async def generate_report_endpoint(dashboard_data: DashboardData):
-    """ダッシュボードデータを受け取り、要約レポートを生成する"""
+def generate_report_endpoint(request: ReportRequest):
+    """ダッシュボードデータ（またはジョブID）を受け取り、要約レポートを生成する"""
+    dashboard_data = _resolve_dashboard(request)
+    cached = report_service.get_cached_report(dashboard_data)
+    if cached is not None:
+        return {"report_text": cached, "cached": True}
     try:
-        # Pydanticモデルを辞書に変換してサービスに渡す
-        report_text = llm_service.generate_narrative_report(dashboard_data.model_dump())
-        return {"report_text": report_text}
+        report_text = report_service.generate_report(dashboard_data)
+        return {"report_text": report_text, "cached": False}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"レポート生成中にエラーが発生しました: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"レポート生成中にエラーが発生しました: {str(e)}")
+
+@router.post("/stream")
+def stream_report_endpoint(request: ReportRequest):
+    """
+    レポートを生成しながら Server-Sent Events で配信する。
+    生成された断片は "chunk"、完了時は全文を含む "done"、失敗時は "error" イベントで送る。
+    キャッシュ済みのレポートは1つの "chunk" としてすぐに返す。
+    """
+    dashboard_data = _resolve_dashboard(request)
+
+    def event(name: str, data: Dict[str, Any]) -> str:
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def event_stream():
+        cached = report_service.get_cached_report(dashboard_data)
+        if cached is not None:
+            yield event("chunk", {"text": cached})
+            yield event("done", {"report_text": cached, "cached": True})
+            return
+        parts = []
+        try:
+            for part in report_service.stream_report(dashboard_data):
+                parts.append(part)
+                yield event("chunk", {"text": part})
+        except Exception as e:
+            print(f"Error during report generation: {e}")
+            yield event("error", {"detail": f"レポート生成中にエラーが発生しました: {str(e)}"})
+            return
+        yield event("done", {"report_text": "".join(parts), "cached": False})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
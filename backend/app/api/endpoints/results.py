@@ -0,0 +1,49 @@
+# backend/app/api/endpoints/results.py
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+from typing import List, Literal, Optional
+from app.services.results_service import result_store
+
+router = APIRouter()
+
+class CommentResult(BaseModel):
+    id: int
+    original_text: str
+    sentiment: Optional[str] = None
+    category: Optional[str] = None
+    score: Optional[int] = None
+    summary: Optional[str] = None
+    is_critical: bool
+    # 判定元。"local" はLLMに送らずローカルの規則で確定したもの
+    source: Literal["llm", "local"] = "llm"
+
+class CommentPage(BaseModel):
+    total: int
+    page: int
+    page_size: int
+    items: List[CommentResult]
+
+@router.get("/{result_id}/comments", response_model=CommentPage)
+def query_comments(
+    result_id: str,
+    sentiment: Optional[Literal["positive", "negative", "neutral"]] = None,
+    category: Optional[str] = None,
+    is_critical: Optional[bool] = None,
+    source: Optional[Literal["llm", "local"]] = None,
+    min_score: Optional[int] = Query(None, ge=1, le=10),
+    max_score: Optional[int] = Query(None, ge=1, le=10),
+    order_by: Literal["row", "score"] = "row",
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=500),
+):
+    """
+    分析結果のコメントを条件で絞り込み、ページ単位で返す。
+    result_id はダッシュボードの resultId（分析ジョブのID）。
+    """
+    if not result_store.exists(result_id):
+        raise HTTPException(status_code=404, detail="指定された分析結果が見つかりません。")
+    return result_store.query(
+        result_id, sentiment=sentiment, category=category, is_critical=is_critical, source=source,
+        min_score=min_score, max_score=max_score, order_by=order_by, page=page, page_size=page_size,
+    )
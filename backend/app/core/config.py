@@ -12,6 +12,71 @@ class Settings:
     PROJECT_NAME: str = "講義アンケート分析アプリ"
     API_V1_STR: str = "/api/v1"
 
+    # --- LLMバックエンド ---
+    # "gemini"（本番）または "fake"（ネットワークを使わない決定的なローカル実装。ベンチマーク用）
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "gemini")
+    GEMINI_MODEL: str = os.getenv("GEMINI_MODEL", "gemini-1.5-flash-latest")
+    FAKE_LLM_LATENCY_SECONDS: float = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0.0"))
+    FAKE_LLM_ERROR_RATE: float = float(os.getenv("FAKE_LLM_ERROR_RATE", "0.0"))
+    FAKE_LLM_MISMATCH_RATE: float = float(os.getenv("FAKE_LLM_MISMATCH_RATE", "0.0"))
+    FAKE_LLM_SEED: int = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+    # --- LLM呼び出しの並列度とレート制限 ---
+    # 分析のLLMバッチとテーマ名の生成はすべてのジョブで共有するスケジューラを通るため、同時実行数・レート制限はプロセス全体での値
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "5"))
+    LLM_BACKOFF_BASE_SECONDS: float = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+    LLM_BACKOFF_MAX_SECONDS: float = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "60.0"))
+    # 1回のバッチ分析で使う入出力トークン数の目安（これを超えないようにコメントを詰める）
+    LLM_BATCH_TOKEN_BUDGET: int = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "8000"))
+
+    # --- コメント分析結果のローカルキャッシュ ---
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", "cache/llm_cache.sqlite3")
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(60 * 60 * 24 * 90)))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "500000"))
+    # レポートは件数とテーマ名が同じなら同じものを返す。保持する件数の上限
+    REPORT_CACHE_MAX_ENTRIES: int = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "1000"))
+
+    # --- 重複・ほぼ同一コメントの集約 ---
+    # 閾値は文字 bigram の Jaccard 係数。低くしすぎると「分かりやすかった」「分かりやすくなかった」のような
+    # 意味の異なる長文コメントまで同じグループに入ってしまうため、高めにしておく
+    DEDUP_ENABLED: bool = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_THRESHOLD: float = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+    DEDUP_NUM_PERM: int = int(os.getenv("DEDUP_NUM_PERM", "64"))
+
+    # --- LLMに送る前のローカルでの判定（「特になし」・絵文字だけ・短い称賛など） ---
+    PRESCREEN_ENABLED: bool = os.getenv("PRESCREEN_ENABLED", "true").lower() == "true"
+    # 判定の確信度がこれ以上のコメントだけをローカルの結果で確定し、それ以外はLLMに送る
+    PRESCREEN_MIN_CONFIDENCE: float = float(os.getenv("PRESCREEN_MIN_CONFIDENCE", "0.8"))
+    # 短い称賛とみなすコメントの最大文字数（記号・空白を除く）
+    PRESCREEN_MAX_PRAISE_CHARS: int = int(os.getenv("PRESCREEN_MAX_PRAISE_CHARS", "20"))
+
+    # --- アップロードされたCSVの保存先 ---
+    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "temp_files")
+    # 最後に使われてからこの時間を過ぎたアップロードは削除する
+    UPLOAD_TTL_SECONDS: int = int(os.getenv("UPLOAD_TTL_SECONDS", str(60 * 60 * 24)))
+    # アップロードの合計サイズの上限。超えた分は最も長く使われていないものから削除する
+    UPLOAD_QUOTA_BYTES: int = int(os.getenv("UPLOAD_QUOTA_BYTES", str(2 * 1024 ** 3)))
+    UPLOAD_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("UPLOAD_SWEEP_INTERVAL_SECONDS", "300"))
+
+    # --- 分析の途中経過（チェックポイント）の保存先 ---
+    CHECKPOINT_DIR: str = os.getenv("CHECKPOINT_DIR", "checkpoints")
+
+    # --- コメント単位の分析結果の保存先（絞り込み・ページング用） ---
+    RESULT_STORE_PATH: str = os.getenv("RESULT_STORE_PATH", "results/results.sqlite3")
+    RESULT_RETENTION_SECONDS: int = int(os.getenv("RESULT_RETENTION_SECONDS", str(60 * 60 * 24 * 7)))
+    # 差分分析で、既存のテーマに当てはまらない新しいコメントの割合がこれを超えたらクラスタリングし直す
+    THEME_DRIFT_THRESHOLD: float = float(os.getenv("THEME_DRIFT_THRESHOLD", "0.15"))
+
+    # --- 分析ジョブ ---
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_RETENTION_SECONDS: int = int(os.getenv("JOB_RETENTION_SECONDS", str(60 * 60 * 24)))
+    # 一括分析で同時に読み込み・集計するファイル数（LLMの同時実行数は LLM_MAX_CONCURRENCY で別に制限される）
+    BATCH_MAX_PARALLEL_FILES: int = int(os.getenv("BATCH_MAX_PARALLEL_FILES", "4"))
+
 settings = Settings()
 
 # --- ↓↓↓ 正しく読み込めたか確認するためのデバッグ用コードです ↓↓↓ ---
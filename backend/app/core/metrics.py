@@ -0,0 +1,214 @@
+# backend/app/core/metrics.py
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# HTTPリクエスト・LLM呼び出し向けのバケット（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# パイプラインの各段階向けのバケット（秒）。大きなアンケートでは数十分かかることもある
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """単調増加するカウンタ"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """累積バケット方式のヒストグラム"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [各バケットの件数..., 合計, 件数]
+        self._values: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            state = self._values.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', repr(bound)))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {state[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus のテキスト形式で全メトリクスを出力する。"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTPリクエストの処理時間", ["method", "path", "status"],
+))
+stage_duration = registry.register(Histogram(
+    "pipeline_stage_duration_seconds", "分析パイプラインの各段階の処理時間", ["stage"], buckets=STAGE_BUCKETS,
+))
+llm_call_duration = registry.register(Histogram(
+    "llm_call_duration_seconds", "LLM呼び出し1回（リトライの1試行）あたりの時間", ["task", "outcome"],
+))
+llm_tokens = registry.register(Counter(
+    "llm_tokens_total", "LLMのトークン使用量", ["task", "direction"],
+))
+llm_retries = registry.register(Counter(
+    "llm_retries_total", "LLM呼び出しのリトライ回数", ["task", "reason"],
+))
+llm_failures = registry.register(Counter(
+    "llm_failures_total", "リトライしても成功しなかったLLM呼び出し（kind=exhausted）と、応答から欠けていた結果（kind=missing_result）の件数", ["task", "kind"],
+))
+prescreen_comments = registry.register(Counter(
+    "prescreen_comments_total", "LLMに送る前のローカル判定の結果（outcome=local: ローカルで確定, llm: LLMに送った）", ["outcome"],
+))
+
+
+class RunProfile:
+    """1回の分析の処理時間とLLM使用量の内訳"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.llm = {"calls": 0, "errors": 0, "retries": 0, "failures": 0, "promptTokens": 0, "responseTokens": 0}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_llm(self, **amounts: int) -> None:
+        with self._lock:
+            for name, amount in amounts.items():
+                self.llm[name] += amount
+
+    def summary(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "totalSeconds": round(time.perf_counter() - self.started_at, 3),
+                "stageSeconds": {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+                "llm": dict(self.llm),
+            }
+
+
+# 実行中の分析の RunProfile。ワーカースレッドへは dispatch_service がコンテキストごと引き継ぐ
+_current_profile: contextvars.ContextVar[Optional[RunProfile]] = contextvars.ContextVar("current_profile", default=None)
+
+
+def current_profile() -> Optional[RunProfile]:
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_run() -> Iterator[RunProfile]:
+    """このブロック内の span・LLM呼び出しを1つの RunProfile に集計する。"""
+    profile = RunProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """パイプラインの1段階の処理時間を計測し、メトリクスと実行中の RunProfile に記録する。"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_duration.observe(elapsed, stage=stage)
+        profile = current_profile()
+        if profile is not None:
+            profile.add_stage(stage, elapsed)
+
+
+def _add_to_profile(**amounts: int) -> None:
+    profile = current_profile()
+    if profile is not None:
+        profile.add_llm(**amounts)
+
+
+def record_llm_call(task: str, seconds: float, succeeded: bool,
+                    prompt_tokens: Optional[int] = None, response_tokens: Optional[int] = None) -> None:
+    """LLM呼び出し1回（リトライの1試行）の結果を記録する。"""
+    llm_call_duration.observe(seconds, task=task, outcome="success" if succeeded else "error")
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, task=task, direction="prompt")
+    if response_tokens:
+        llm_tokens.inc(response_tokens, task=task, direction="response")
+    _add_to_profile(calls=1, errors=0 if succeeded else 1,
+                    promptTokens=prompt_tokens or 0, responseTokens=response_tokens or 0)
+
+
+def record_llm_retry(task: str, reason: str) -> None:
+    llm_retries.inc(task=task, reason=reason)
+    _add_to_profile(retries=1)
+
+
+def record_llm_failure(task: str, kind: str, count: int = 1) -> None:
+    llm_failures.inc(count, task=task, kind=kind)
+    _add_to_profile(failures=count)
@@ -1,53 +1,489 @@
 # backend/app/services/analysis_service.py
-from typing import List, IO, Dict, Any
+import hashlib
+import heapq
+import threading
+import uuid
+from contextlib import ExitStack
+from typing import List, IO, Dict, Any, Callable, Optional, Sequence, Tuple, Union
 from pathlib import Path
 from collections import Counter
-from . import preprocessing_service, llm_service
+from app.core.config import settings
+from app.core import metrics
+from . import (
+    preprocessing_service, llm_service, dispatch_service, dedup_service, checkpoint_service, theme_service,
+    prescreen_service,
+)
+from .results_service import result_store
+from .cache_service import comment_cache, normalize_text
+
+class AnalysisCancelled(Exception):
+    """分析ジョブがキャンセルされたことを表す例外"""
+
+
+# 進捗通知用のコールバック。(完了したバッチ数, 全バッチ数) を受け取る
+ProgressCallback = Callable[[int, int], None]
+
+# ダッシュボードに載せる重要度上位のコメント数と、要対応コメントの件数の上限。
+# それ以外のコメントは結果ストアからページ単位で問い合わせる
+TOP_RANKED_COUNT = 10
+CRITICAL_PREVIEW_COUNT = 20
+
+def _push_top(heap: List, entry: Any, k: int) -> None:
+    """サイズ k の最小ヒープに entry を加え、上位 k 件だけを残す。"""
+    if len(heap) < k:
+        heapq.heappush(heap, entry)
+    elif entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+def pack_batches(keys: List[str], texts: Dict[str, str], token_budget: int, max_items: int) -> List[List[str]]:
+    """
+    推定トークン数が token_budget を超えない範囲でコメントをバッチに詰める。
+    1バッチの件数は max_items を上限とし、単独で予算を超える長文コメントは1件だけのバッチにする。
+    """
+    batches: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for key in keys:
+        tokens = llm_service.estimate_comment_tokens(texts[key])
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(key)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def row_keys_for(comments: Sequence[str], key_values: Optional[Sequence[Any]] = None) -> Tuple[List[str], List[str]]:
+    """
+    各行の行キーと本文のハッシュを返す。行キーはキー列の値（無ければ本文のハッシュ）で、
+    同じ値が複数回現れる場合は出現順の番号を付けて区別する。
+    """
+    content_hashes = [hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:32] for text in comments]
+    occurrences: Counter = Counter()
+    row_keys = []
+    for i, content_hash in enumerate(content_hashes):
+        value = key_values[i] if key_values is not None else None
+        base = str(value).strip() if isinstance(value, str) and value.strip() else content_hash
+        row_keys.append(f"{base}#{occurrences[base]}")
+        occurrences[base] += 1
+    return row_keys, content_hashes
+
+def journal_for_run(file_id: str, column_name: Union[str, Sequence[str]], batch_size: int) -> checkpoint_service.AnalysisJournal:
+    """分析の実行パラメータ（複数の列をまとめて分析する場合は列名のリスト）に対応するチェックポイントのジャーナルを返す。"""
+    return checkpoint_service.journal_for(file_id, {
+        "column_name": column_name if isinstance(column_name, str) else list(column_name),
+        "batch_size": batch_size,
+        "model": llm_service.MODEL_NAME,
+        "prompt_version": llm_service.PROMPT_VERSION,
+    })
 
 # 引数を file: IO[bytes] から file_path: Path に変更
-def analyze_comments_from_file(file_path: Path, column_name: str, batch_size: int) -> Dict[str, Any]:
+def analyze_comments_from_file(file_path: Path, column_name: str, batch_size: int,
+                               progress_callback: Optional[ProgressCallback] = None,
+                               cancel_event: Optional[threading.Event] = None,
+                               journal: Optional[checkpoint_service.AnalysisJournal] = None,
+                               result_id: Optional[str] = None,
+                               incremental: bool = False,
+                               row_key_column: Optional[str] = None) -> Dict[str, Any]:
     """
     CSVファイルを分析し、サマリーダッシュボード用のデータを生成する。
+    progress_callback にはバッチが完了するたびに進捗が通知される。
+    cancel_event がセットされると、未着手のバッチを打ち切って AnalysisCancelled を送出する。
+    journal を渡すと完了したバッチの結果が追記され、同じジャーナルで再実行すると完了済みの分は処理をスキップする。
+    各段階の処理時間とLLMの使用量は、ダッシュボードの "profile" に添付する。
+    コメント単位の結果は result_id（省略時は新しく採番）で結果ストアに保存され、ダッシュボードの "resultId" で参照できる。
+
+    incremental が True の場合は、保存済みの分析結果 result_id をこのファイルの内容に合わせて更新する。
+    行キー（row_key_column の値、省略時は本文のハッシュ）で前回と比べ、追加・変更された行だけをLLMで分析し、
+    集計値とテーマは前回の値に差分を反映して求める。
     """
-    # この関数内でファイルを開いて、すぐに閉じるように変更
-    with open(file_path, "rb") as f:
-        df = preprocessing_service.preprocess_csv(f, column_name)
-    
-    comments = df[column_name].astype(str).tolist()
-
-    # --- 個別コメントの分析（バッチ処理） ---
-    all_results_dicts = []
-    for i in range(0, len(comments), batch_size):
-        batch_comments = comments[i:i + batch_size]
-        print(f"Processing batch {i // batch_size + 1} ({len(batch_comments)} comments)...")
-        
-        batch_results = llm_service.analyze_comments_in_batch(batch_comments)
-        
-        for original_comment, result_dict in zip(batch_comments, batch_results):
+    result_id = result_id or str(uuid.uuid4())
+    with result_store.result_lock(result_id), metrics.profile_run() as profile:
+        runs, _ = _build_dashboards(file_path, [(column_name, result_id)], batch_size, progress_callback, cancel_event,
+                                    journal, result_id, incremental, row_key_column)
+    dashboard_data = runs[0].dashboard
+    dashboard_data["profile"] = profile.summary()
+    print(f"Run profile: {dashboard_data['profile']}")
+    return dashboard_data
+
+def analyze_columns_from_file(file_path: Path, column_names: Sequence[str], batch_size: int,
+                              progress_callback: Optional[ProgressCallback] = None,
+                              cancel_event: Optional[threading.Event] = None,
+                              journal: Optional[checkpoint_service.AnalysisJournal] = None,
+                              result_id: Optional[str] = None,
+                              row_key_column: Optional[str] = None) -> Dict[str, Any]:
+    """
+    CSVの複数の自由記述列（「良かった点」「改善点」など）を、1回の読み込みでまとめて分析する。
+    すべての列のコメントを同じLLMバッチに詰めて分析し、結果はコメントのキーで各列に振り分ける
+    （同じ本文のコメントは列が違っても1回だけ分析される）。
+    列ごとのダッシュボード（"columns"）と、全列を合わせたダッシュボード（"combined"）を返す。
+    列ごとのコメント単位の結果は "{result_id}-{列の番号}" で結果ストアに保存される。
+    """
+    result_id = result_id or str(uuid.uuid4())
+    columns = [(column_name, f"{result_id}-{i + 1}") for i, column_name in enumerate(column_names)]
+    with ExitStack() as stack:
+        for _, column_result_id in columns:
+            stack.enter_context(result_store.result_lock(column_result_id))
+        profile = stack.enter_context(metrics.profile_run())
+        runs, shared_stats = _build_dashboards(file_path, columns, batch_size, progress_callback, cancel_event,
+                                               journal, result_id, False, row_key_column)
+        combined = _combine_dashboards(runs, shared_stats)
+    results = {
+        "columns": [{"columnName": run.column_name, **run.dashboard} for run in runs],
+        "combined": combined,
+        "profile": profile.summary(),
+    }
+    print(f"Run profile: {results['profile']}")
+    return results
+
+
+class _ColumnRun:
+    """1つの自由記述列の分析の途中経過と、その列のダッシュボード"""
+
+    def __init__(self, column_name: str, result_id: str, comments: List[str], key_values: Optional[List[Any]]):
+        self.column_name = column_name
+        self.result_id = result_id
+        self.comments = comments
+        self.row_keys, self.content_hashes = row_keys_for(comments, key_values)
+        self.dashboard: Dict[str, Any] = {}
+        # テーマ集約用の、今回分析した行の「本文 → 件数」と、差分分析で消えた・変わる前の行の「本文 → 件数」
+        self.theme_counts = {"positive": Counter(), "negative": Counter()}
+        self.theme_removed = {"positive": Counter(), "negative": Counter()}
+
+    def diff_against_base(self, incremental: bool) -> None:
+        """
+        前回の分析結果と比べて、分析が必要な行を求める。
+        行キーが同じで本文も変わっていない行は前回の結果をそのまま使い、追加・変更された行だけを分析する。
+        """
+        self.base_dashboard = None
+        base_rows = {}
+        if incremental:
+            self.base_dashboard = (result_store.run_info(self.result_id) or {}).get("dashboard")
+            if self.base_dashboard is None:
+                raise ValueError("差分の基準となる分析結果が見つからないか、前回の分析が完了していません。")
+            base_rows = result_store.row_states(self.result_id)
+        self.pending_rows: List[int] = []
+        self.replaced_rows = []
+        self.moved_rows: List[Tuple[str, int]] = []
+        for row_index, (row_key, content_hash) in enumerate(zip(self.row_keys, self.content_hashes)):
+            stored = base_rows.pop(row_key, None)
+            if stored is not None and stored.content_hash == content_hash:
+                if stored.row_index != row_index:
+                    self.moved_rows.append((row_key, row_index))
+                continue
+            self.pending_rows.append(row_index)
+            if stored is not None:
+                self.replaced_rows.append((row_key, stored))
+        # 残ったものは今回のファイルから消えた行
+        self.removed_rows = list(base_rows.items())
+        self.row_changes = {
+            "unchangedRows": len(self.comments) - len(self.pending_rows),
+            "newRows": len(self.pending_rows) - len(self.replaced_rows),
+            "changedRows": len(self.replaced_rows),
+            "removedRows": len(self.removed_rows),
+        }
+        if incremental:
+            print(f"Incremental: {self.row_changes}")
+        self.pending_texts = [self.comments[i] for i in self.pending_rows]
+
+    def group_near_duplicates(self) -> None:
+        """
+        重複・ほぼ同一のコメントを集約する。グループの代表だけを分析し、結果は後でグループの全メンバーに展開する。
+        同じ本文（正規化後）は1回だけ分析すればよいので、代表はキャッシュのキー単位で扱う。
+        """
+        if settings.DEDUP_ENABLED:
+            self.groups = dedup_service.group_near_duplicates(
+                self.pending_texts, threshold=settings.DEDUP_THRESHOLD, num_perm=settings.DEDUP_NUM_PERM
+            )
+        else:
+            self.groups = dedup_service.DedupGroups(
+                list(range(len(self.pending_texts))), list(range(len(self.pending_texts)))
+            )
+        self.representative_texts = [self.pending_texts[i] for i in self.groups.representatives]
+        self.keys = [comment_cache.key_for(text) for text in self.representative_texts]
+        print(f"Dedup: {len(self.pending_texts)} comments collapsed into {len(self.representative_texts)} groups.")
+
+    def aggregate(self, results_by_key: Dict[str, Dict[str, Any]], incremental: bool,
+                  row_key_column: Optional[str]) -> None:
+        """
+        キャッシュヒットと新規の結果を、グループのメンバー全員に元の順番で展開しながら集計する。
+        全件の結果はメモリに持たず、件数はカウンタ、上位のコメントはヒープで保持し、
+        コメント単位の結果は結果ストアに書き出す。差分分析では前回の集計値から消えた行・変わる前の行を差し引く。
+        """
+        sentiment_counts: Counter = Counter()
+        category_counts: Counter = Counter()
+        critical_count = 0
+        if incremental:
+            base_summary = self.base_dashboard["summary"]
+            sentiment_counts.update({
+                "positive": base_summary["positiveCount"], "negative": base_summary["negativeCount"],
+                "neutral": base_summary["neutralCount"],
+            })
+            category_counts.update(self.base_dashboard["categoryDistribution"])
+            critical_count = base_summary["criticalCount"]
+            for _, stored in self.replaced_rows + self.removed_rows:
+                sentiment_counts[stored.sentiment] -= 1
+                category_counts[stored.category] -= 1
+                critical_count -= stored.is_critical
+                if stored.sentiment in self.theme_removed:
+                    self.theme_removed[stored.sentiment][stored.original_text] += 1
+            result_store.delete_rows(self.result_id, [key for key, _ in self.replaced_rows + self.removed_rows])
+            result_store.move_rows(self.result_id, self.moved_rows)
+
+        writer = result_store.writer(self.result_id, row_key_column, replace=not incremental)
+        # (スコア, -行番号) の最小ヒープ。スコアが同じ場合は先に出てきたコメントを優先する
+        top_ranked_heap: List = []
+        critical_heap: List = []
+        self.failed_comments = 0
+        for group, row_index, original_comment in zip(self.groups.assignments, self.pending_rows, self.pending_texts):
+            result_dict = results_by_key.get(self.keys[group])
+            if not result_dict:
+                self.failed_comments += 1
+                continue
+            writer.add(self.row_keys[row_index], self.content_hashes[row_index], row_index, original_comment, result_dict)
+            sentiment = result_dict.get('sentiment')
+            sentiment_counts[sentiment] += 1
+            category_counts[result_dict.get('category')] += 1
+            if sentiment in self.theme_counts:
+                self.theme_counts[sentiment][original_comment] += 1
+            entry = (result_dict.get('score') or 0, -row_index)
+            _push_top(top_ranked_heap, entry, TOP_RANKED_COUNT)
+            if result_dict.get('is_critical'):
+                critical_count += 1
+                _push_top(critical_heap, entry, CRITICAL_PREVIEW_COUNT)
+        writer.flush()
+        if self.failed_comments:
+            # 分析できなかったコメントは黙って捨てず、件数を processingStats で報告する
+            print(f"Warning: {self.failed_comments} comments could not be analyzed and are excluded from the dashboard.")
+
+        def comments_from_heap(heap: List) -> List[Dict[str, Any]]:
+            # 差分分析でない場合は全行が分析対象なので、行番号とグループの割り当ての位置が一致する
+            rows = [-neg_row for _, neg_row in sorted(heap, reverse=True)]
+            return [
+                {'source': 'llm', **results_by_key[self.keys[self.groups.assignments[row]]], 'id': row,
+                 'original_text': self.comments[row]}
+                for row in rows
+            ]
+
+        if incremental:
+            # 前回の行も含めた上位は、スコアの索引を使って結果ストアから取り出す
+            top_ranked_comments = result_store.query(
+                self.result_id, order_by="score", page_size=TOP_RANKED_COUNT)["items"]
+            critical_comments = result_store.query(
+                self.result_id, is_critical=True, order_by="score", page_size=CRITICAL_PREVIEW_COUNT)["items"]
+        else:
+            top_ranked_comments = comments_from_heap(top_ranked_heap)
+            critical_comments = comments_from_heap(critical_heap)
+
+        total_comments = sum(sentiment_counts.values())
+        self.dashboard = {
+            "summary": { "totalComments": total_comments, "positiveCount": sentiment_counts.get('positive', 0), "negativeCount": sentiment_counts.get('negative', 0), "neutralCount": sentiment_counts.get('neutral', 0), "criticalCount": critical_count, },
+            "categoryDistribution": dict(+category_counts), "topPositiveThemes": [], "topNegativeThemes": [],
+            "criticalComments": critical_comments, "topRankedComments": top_ranked_comments, "resultId": self.result_id,
+        }
+
+    def refresh_themes(self, polarity: str, num_clusters: int, tenant: str, incremental: bool) -> bool:
+        """テーマを更新してダッシュボードに載せ、クラスタリングし直したかどうかを返す。"""
+        themes, reclustered = theme_service.refresh_themes(
+            self.result_id, polarity, num_clusters, self.theme_counts[polarity], tenant,
+            self.theme_removed[polarity], incremental=incremental,
+        )
+        self.dashboard["topPositiveThemes" if polarity == "positive" else "topNegativeThemes"] = themes
+        return reclustered
+
+
+# テーマの数（ポジティブ・ネガティブ）
+THEME_CLUSTERS = {"positive": 5, "negative": 7}
+
+def _build_dashboards(file_path: Path, columns: List[Tuple[str, str]], batch_size: int,
+                      progress_callback: Optional[ProgressCallback],
+                      cancel_event: Optional[threading.Event],
+                      journal: Optional[checkpoint_service.AnalysisJournal],
+                      tenant: str, incremental: bool,
+                      row_key_column: Optional[str]) -> Tuple[List[_ColumnRun], Dict[str, Any]]:
+    """
+    (列名, result_id) の各列を分析し、列ごとの _ColumnRun（dashboard を含む）と、全列で共有した処理の統計を返す。
+    CSVの読み込み、キャッシュの参照、ローカルでの判定、LLMバッチはすべての列でまとめて1回ずつ行う。
+    LLMバッチは共有スケジューラの tenant のキューに入る。
+    """
+    def check_cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            raise AnalysisCancelled("分析はキャンセルされました。")
+
+    # アップロード時に判定した文字コード・区切り文字があれば、それを使って対象列だけを読み込む
+    with metrics.span("parse_csv"):
+        file_info = preprocessing_service.load_file_info(file_path)
+        column_names = [column_name for column_name, _ in columns]
+        with open(file_path, "rb") as f:
+            df = preprocessing_service.preprocess_csv(
+                f, column_names, file_info, extra_columns=[row_key_column] if row_key_column else [],
+            )
+        runs = []
+        for column_name, result_id in columns:
+            # 複数の列を読み込んだ場合、この列だけが空の行もあるので除く
+            present = df[column_name].fillna("").str.strip() != ""
+            runs.append(_ColumnRun(
+                column_name, result_id, df.loc[present, column_name].astype(str).tolist(),
+                df.loc[present, row_key_column].tolist() if row_key_column else None,
+            ))
+        del df
+
+    # --- 前回の分析結果との差分 ---
+    for run in runs:
+        run.diff_against_base(incremental)
+
+    # --- 重複・ほぼ同一コメントの集約 ---
+    with metrics.span("dedup"):
+        for run in runs:
+            run.group_near_duplicates()
+    # すべての列の代表コメント（キー → 本文）。列が違っても同じ本文は1回だけ分析する
+    texts_by_key: Dict[str, str] = {}
+    for run in runs:
+        for key, text in zip(run.keys, run.representative_texts):
+            texts_by_key.setdefault(key, text)
+
+    # --- キャッシュの参照 ---
+    with metrics.span("cache_lookup"):
+        results_by_key = comment_cache.get_many(list(texts_by_key)) if settings.LLM_CACHE_ENABLED else {}
+    cached_keys = set(results_by_key)
+    print(f"Cache: {len(cached_keys)} hits, {len(texts_by_key) - len(cached_keys)} misses ({len(texts_by_key)} unique comments).")
+
+    # --- 前回の中断した実行で完了していた分の読み戻し ---
+    resumed_keys = set()
+    if journal is not None:
+        for key, result in journal.load().items():
+            if key not in results_by_key:
+                results_by_key[key] = result
+                resumed_keys.add(key)
+        if resumed_keys:
+            print(f"Resuming from checkpoint: {len(resumed_keys)} unique comments already analyzed.")
+
+    miss_texts = {key: text for key, text in texts_by_key.items() if key not in results_by_key}
+
+    # --- ローカルでの判定 ---
+    # 「特になし」や絵文字だけの回答、短い称賛など、確信度の高いものはLLMに送らずに確定する。
+    # 結果は "source": "local" で区別し、判定規則を変えたときに古い判定が残らないようキャッシュには入れない
+    local_keys = set()
+    if settings.PRESCREEN_ENABLED:
+        with metrics.span("prescreen"):
+            for key, text in list(miss_texts.items()):
+                screened = prescreen_service.classify(text, settings.PRESCREEN_MAX_PRAISE_CHARS)
+                if screened is not None and screened[1] >= settings.PRESCREEN_MIN_CONFIDENCE:
+                    results_by_key[key] = screened[0]
+                    del miss_texts[key]
+                    local_keys.add(key)
+        metrics.prescreen_comments.inc(len(local_keys), outcome="local")
+        metrics.prescreen_comments.inc(len(miss_texts), outcome="llm")
+        print(f"Prescreen: {len(local_keys)} comments classified locally, {len(miss_texts)} sent to the LLM.")
+    miss_keys = list(miss_texts)
+
+    # --- キャッシュミスしたコメントの分析（バッチ処理） ---
+    # batch_size は1バッチの件数の上限として扱い、実際の区切りは推定トークン数で決める。
+    # 複数の列のコメントも同じバッチに詰める（結果はキーで各列に振り分けられる）。
+    # バッチは並列にディスパッチされるが、結果は入力順で返ってくる
+    batches = pack_batches(miss_keys, miss_texts, settings.LLM_BATCH_TOKEN_BUDGET, batch_size)
+    total_batches = len(batches)
+    completed_batches = 0
+    progress_lock = threading.Lock()
+    if progress_callback:
+        progress_callback(0, total_batches)
+
+    def process_batch(indexed_batch):
+        nonlocal completed_batches
+        batch_index, batch_keys = indexed_batch
+        check_cancelled()
+        print(f"Processing batch {batch_index + 1}/{total_batches} ({len(batch_keys)} comments)...")
+        batch_results = llm_service.analyze_comments_in_batch([miss_texts[key] for key in batch_keys])
+        # バッチ単位で保存しておけば、途中で中断しても完了分は次回の実行で再利用される
+        completed = {key: result for key, result in zip(batch_keys, batch_results) if result}
+        if settings.LLM_CACHE_ENABLED:
+            comment_cache.put_many(completed)
+        if journal is not None:
+            journal.append(completed)
+        with progress_lock:
+            completed_batches += 1
+            if progress_callback:
+                progress_callback(completed_batches, total_batches)
+        return batch_results
+
+    with metrics.span("llm_batches"):
+        # バッチは全ジョブ共有のスケジューラに入り、他の分析のバッチと交互に処理される
+        all_batch_results = dispatch_service.llm_scheduler.map(tenant, process_batch, enumerate(batches))
+    check_cancelled()
+
+    for batch_keys, batch_results in zip(batches, all_batch_results):
+        for key, result_dict in zip(batch_keys, batch_results):
             if result_dict:
-                result_dict['original_text'] = original_comment
-                all_results_dicts.append(result_dict)
-
-    # --- ここからが集計・サマリー処理 ---
-    total_comments = len(all_results_dicts)
-    sentiment_counts = Counter(r.get('sentiment') for r in all_results_dicts)
-    category_counts = Counter(r.get('category') for r in all_results_dicts)
-    critical_comments = [r for r in all_results_dicts if r.get('is_critical')]
-    sorted_by_score = sorted(all_results_dicts, key=lambda r: r.get('score', 0), reverse=True)
-    top_ranked_comments = sorted_by_score[:10]
-    positive_comments = [r['original_text'] for r in all_results_dicts if r.get('sentiment') == 'positive']
-    negative_comments = [r['original_text'] for r in all_results_dicts if r.get('sentiment') == 'negative']
-
-    # LLMによるテーマ集約
-    top_positive_themes = llm_service.cluster_and_summarize_comments(positive_comments, num_clusters=5)
-    top_negative_themes = llm_service.cluster_and_summarize_comments(negative_comments, num_clusters=7)
+                results_by_key[key] = result_dict
+
+    with metrics.span("aggregate"):
+        for run in runs:
+            run.aggregate(results_by_key, incremental, row_key_column)
+
+    # テーマ集約（ローカルでクラスタリングし、LLMはテーマ名だけを付ける。列・ポジティブ・ネガティブを並列に実行し、
+    # テーマ名の生成はLLMバッチと同じく共有スケジューラを通る）。
+    # 差分分析では新しいコメントを既存のテーマに割り当て、ずれが大きくなった場合だけクラスタリングし直す
+    with metrics.span("themes"):
+        targets = [(run, polarity) for run in runs for polarity in THEME_CLUSTERS]
+        reclustered = dispatch_service.run_parallel(*[
+            (lambda run=run, polarity=polarity: run.refresh_themes(polarity, THEME_CLUSTERS[polarity], tenant, incremental))
+            for run, polarity in targets
+        ])
 
     # 最終的なダッシュボード用データを構築
-    dashboard_data = {
-        "summary": { "totalComments": total_comments, "positiveCount": sentiment_counts.get('positive', 0), "negativeCount": sentiment_counts.get('negative', 0), "neutralCount": sentiment_counts.get('neutral', 0), },
-        "categoryDistribution": dict(category_counts), "topPositiveThemes": top_positive_themes, "topNegativeThemes": top_negative_themes,
-        "criticalComments": critical_comments, "topRankedComments": top_ranked_comments,
+    for run in runs:
+        keys = set(run.keys)
+        run.dashboard["processingStats"] = {
+            "uniqueComments": len(run.representative_texts), "cacheHits": len(keys & cached_keys),
+            "cacheMisses": len(keys - cached_keys), "resumedFromCheckpoint": len(keys & resumed_keys),
+            "llmComments": len(keys & miss_texts.keys()), "llmBatches": total_batches,
+            "localComments": len(keys & local_keys),
+            "localTokensSaved": sum(llm_service.estimate_comment_tokens(texts_by_key[key]) for key in keys & local_keys),
+            "failedComments": run.failed_comments, "rowChanges": run.row_changes,
+            "reclusteredThemes": [
+                polarity for (target, polarity), done in zip(targets, reclustered) if target is run and done
+            ],
+        }
+        result_store.save_dashboard(run.result_id, run.dashboard)
+        print(f"Dashboard data successfully generated for {run.dashboard['summary']['totalComments']} comments.")
+
+    shared_stats = {
+        "uniqueComments": len(texts_by_key), "cacheHits": len(cached_keys), "cacheMisses": len(texts_by_key) - len(cached_keys),
+        "resumedFromCheckpoint": len(resumed_keys), "llmComments": len(miss_keys), "llmBatches": total_batches,
+        "localComments": len(local_keys),
+        "localTokensSaved": sum(llm_service.estimate_comment_tokens(texts_by_key[key]) for key in local_keys),
+        "failedComments": sum(run.failed_comments for run in runs),
+    }
+    return runs, shared_stats
+
+def _combine_dashboards(runs: List[_ColumnRun], shared_stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    全列を合わせたダッシュボードを作る。件数は各列の合計、上位・要対応のコメントとテーマは全列から
+    重要度・件数の順に選ぶ。テーマは各列で付けたものをそのまま使い、全列を合わせてクラスタリングし直すことはしない
+    （テーマ名を付け直すLLM呼び出しが、バッチを共有して減らした分を上回るため）。
+    コメントとテーマには "columnName" と、その列の "resultId" を付ける。
+    """
+    summary: Counter = Counter()
+    category_counts: Counter = Counter()
+    for run in runs:
+        summary.update(run.dashboard["summary"])
+        category_counts.update(run.dashboard["categoryDistribution"])
+
+    def top_across_columns(field: str, count: int, key: str) -> List[Dict[str, Any]]:
+        items = [
+            {**item, "columnName": run.column_name, "resultId": run.result_id}
+            for run in runs for item in run.dashboard[field]
+        ]
+        # 同じ値なら、列の順・元の順を保つ（sorted は安定ソート）
+        return sorted(items, key=lambda item: item.get(key) or 0, reverse=True)[:count]
+
+    return {
+        "summary": dict(summary), "categoryDistribution": dict(category_counts),
+        "topPositiveThemes": top_across_columns("topPositiveThemes", THEME_CLUSTERS["positive"], "count"),
+        "topNegativeThemes": top_across_columns("topNegativeThemes", THEME_CLUSTERS["negative"], "count"),
+        "criticalComments": top_across_columns("criticalComments", CRITICAL_PREVIEW_COUNT, "score"),
+        "topRankedComments": top_across_columns("topRankedComments", TOP_RANKED_COUNT, "score"),
+        "columnSummaries": [{"columnName": run.column_name, "resultId": run.result_id, **run.dashboard["summary"]} for run in runs],
+        "processingStats": shared_stats,
     }
-    
-    print(f"Dashboard data successfully generated for {total_comments} comments.")
-    return dashboard_data
\ No newline at end of file
@@ -0,0 +1,93 @@
+# backend/app/services/batch_service.py
+
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from app.core.config import settings
+from . import analysis_service, checkpoint_service, dispatch_service
+from .analysis_service import AnalysisCancelled
+
+SENTIMENTS = ("positive", "negative", "neutral")
+
+
+class BatchItem(NamedTuple):
+    """一括分析の対象となる1ファイル（1科目）"""
+    label: str
+    file_id: str
+    file_path: Path
+    column_name: str
+    result_id: str
+    journal: Optional[checkpoint_service.AnalysisJournal] = None
+
+
+def analyze_files(items: List[BatchItem], batch_size: int,
+                  progress_callback: Optional[Callable[[int, int], None]] = None,
+                  cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    複数のCSVをまとめて分析し、科目ごとのダッシュボードと科目間の比較表を返す。
+    ファイルは BATCH_MAX_PARALLEL_FILES 件ずつ並行して処理し、各ファイルのLLMバッチは共有スケジューラで
+    ファイル間を順番に回りながら処理される（レート制限もプロセス全体で1つ）。
+    1つのファイルの失敗は全体を止めず、その科目の "error" に記録する。進捗は全ファイルのバッチ数の合計で報告する。
+    """
+    progress = [(0, 0)] * len(items)
+    progress_lock = threading.Lock()
+
+    def report_progress(index: int):
+        def callback(completed: int, total: int) -> None:
+            with progress_lock:
+                progress[index] = (completed, total)
+                done, overall = sum(c for c, _ in progress), sum(t for _, t in progress)
+            if progress_callback:
+                progress_callback(done, overall)
+        return callback
+
+    def analyze(indexed_item) -> Dict[str, Any]:
+        index, item = indexed_item
+        try:
+            dashboard = analysis_service.analyze_comments_from_file(
+                item.file_path, item.column_name, batch_size,
+                progress_callback=report_progress(index), cancel_event=cancel_event, journal=item.journal,
+                result_id=item.result_id,
+            )
+        except AnalysisCancelled:
+            raise
+        except Exception as e:
+            print(f"Batch analysis of '{item.label}' failed: {e}")
+            return {"label": item.label, "fileId": item.file_id, "resultId": None, "error": str(e), "dashboard": None}
+        return {"label": item.label, "fileId": item.file_id, "resultId": item.result_id, "error": None, "dashboard": dashboard}
+
+    courses = dispatch_service.map_ordered(analyze, enumerate(items), max_in_flight=settings.BATCH_MAX_PARALLEL_FILES)
+    return {"courses": courses, "comparison": compare_courses(courses)}
+
+
+def compare_courses(courses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    科目ごとの感情・要対応コメント・カテゴリの割合を並べた比較表を作る。
+    件数の違う科目どうしを比べられるよう、値はすべてその科目のコメント数に対する割合にする。
+    """
+    categories = sorted({
+        category for course in courses if course["dashboard"]
+        for category in course["dashboard"]["categoryDistribution"]
+    })
+    rows = []
+    for course in courses:
+        dashboard = course["dashboard"]
+        if dashboard is None:
+            continue
+        summary = dashboard["summary"]
+        total = summary["totalComments"]
+
+        def rate(count: int) -> float:
+            return round(count / total, 4) if total else 0.0
+
+        rows.append({
+            "label": course["label"],
+            "resultId": course["resultId"],
+            "totalComments": total,
+            **{f"{sentiment}Rate": rate(summary[f"{sentiment}Count"]) for sentiment in SENTIMENTS},
+            "criticalRate": rate(summary.get("criticalCount", 0)),
+            "categoryRates": {
+                category: rate(dashboard["categoryDistribution"].get(category, 0)) for category in categories
+            },
+        })
+    return {"categories": categories, "rows": rows}
@@ -0,0 +1,193 @@
+# backend/app/services/cache_service.py
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+from app.core.config import settings
+from . import llm_service
+
+# SQLite の変数上限に引っかからないよう、IN 句はこの件数ずつに分割する
+_QUERY_CHUNK_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用の正規化（NFKC・前後空白の除去・空白の畳み込み）"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+class CommentCache:
+    """
+    コメント単位のLLM分析結果を保存する、内容アドレス方式の永続キャッシュ。
+    キーは「正規化したコメント本文 + モデル名 + プロンプトバージョン」のハッシュ。
+    古いエントリは TTL で失効し、件数上限を超えると最終アクセスが古い順（LRU）に削除される。
+    """
+
+    def __init__(self, path: str, model_name: str, prompt_version: str, ttl_seconds: int, max_entries: int):
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS comment_analysis (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_comment_analysis_last_accessed ON comment_analysis (last_accessed)"
+            )
+
+    def key_for(self, text: str) -> str:
+        raw = f"{self.model_name}\0{self.prompt_version}\0{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """キーに対応するキャッシュ済みの結果を返す。見つからないキーは結果に含まれない。"""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Dict[str, Any]] = {}
+        now = time.time()
+        expires_before = now - self.ttl_seconds
+        with self._lock, self._conn:
+            for i in range(0, len(keys), _QUERY_CHUNK_SIZE):
+                chunk = keys[i:i + _QUERY_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, result FROM comment_analysis WHERE key IN ({placeholders}) AND created_at >= ?",
+                    (*chunk, expires_before),
+                ).fetchall()
+                for key, result in rows:
+                    found[key] = json.loads(result)
+            if found:
+                self._conn.executemany(
+                    "UPDATE comment_analysis SET last_accessed = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+        return found
+
+    def put_many(self, items: Dict[str, Dict[str, Any]]) -> None:
+        """結果を保存し、必要に応じて期限切れ・上限超過分を削除する。"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO comment_analysis (key, model, prompt_version, result, created_at, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (key, self.model_name, self.prompt_version, json.dumps(result, ensure_ascii=False), now, now)
+                    for key, result in items.items()
+                ],
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM comment_analysis WHERE created_at < ?", (now - self.ttl_seconds,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM comment_analysis").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM comment_analysis WHERE key IN "
+                "(SELECT key FROM comment_analysis ORDER BY last_accessed ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def purge_stale_versions(self) -> int:
+        """現在のモデル・プロンプトバージョン以外で作られたエントリを削除する。"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM comment_analysis WHERE model != ? OR prompt_version != ?",
+                (self.model_name, self.prompt_version),
+            )
+            return cursor.rowcount
+
+
+class ReportCache:
+    """
+    生成済みのレポートを保存する永続キャッシュ。
+    キーは「プロンプトに使う項目（件数・テーマ名） + モデル名 + レポートのプロンプトバージョン」のハッシュ。
+    コメント単位のキャッシュと同じファイルの別テーブルに保存する。
+    """
+
+    def __init__(self, path: str, model_name: str, prompt_version: str, ttl_seconds: int, max_entries: int):
+        self.model_name = model_name
+        self.prompt_version = prompt_version
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS narrative_report (
+                    key TEXT PRIMARY KEY,
+                    report TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL
+                )"""
+            )
+
+    def key_for(self, fields: Dict[str, Any]) -> str:
+        raw = f"{self.model_name}\0{self.prompt_version}\0{json.dumps(fields, ensure_ascii=False, sort_keys=True)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT report FROM narrative_report WHERE key = ? AND created_at >= ?", (key, now - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE narrative_report SET last_accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, report: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO narrative_report (key, report, created_at, last_accessed) VALUES (?, ?, ?, ?)",
+                (key, report, now, now),
+            )
+            self._conn.execute("DELETE FROM narrative_report WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "DELETE FROM narrative_report WHERE key NOT IN "
+                "(SELECT key FROM narrative_report ORDER BY last_accessed DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+
+comment_cache = CommentCache(
+    settings.LLM_CACHE_PATH,
+    model_name=llm_service.MODEL_NAME,
+    prompt_version=llm_service.PROMPT_VERSION,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+)
+
+report_cache = ReportCache(
+    settings.LLM_CACHE_PATH,
+    model_name=llm_service.MODEL_NAME,
+    prompt_version=llm_service.REPORT_PROMPT_VERSION,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    max_entries=settings.REPORT_CACHE_MAX_ENTRIES,
+)
+
+# プロンプトが変わった場合、古いバージョンの結果はもう参照されないので起動時に掃除しておく
+_purged = comment_cache.purge_stale_versions()
+if _purged:
+    print(f"Purged {_purged} cached analysis results from previous prompt versions.")
@@ -0,0 +1,66 @@
+# backend/app/services/checkpoint_service.py
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict
+from app.core.config import settings
+
+CHECKPOINT_DIR = Path(settings.CHECKPOINT_DIR)
+CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+
+
+class AnalysisJournal:
+    """
+    1回の分析の途中経過を追記していくジャーナル（JSON Lines）。
+    バッチが完了するたびに、そのバッチの結果（コメントのキー → 分析結果）を1行ずつ書き込む。
+    プロセスが落ちても、再実行時に完了済みの結果を読み戻して残りのバッチだけを処理できる。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """これまでに記録された結果を読み込む。書きかけの最終行などの壊れた行は無視する。"""
+        results: Dict[str, Dict[str, Any]] = {}
+        if not self.path.exists():
+            return results
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    results.update(json.loads(line)["results"])
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+        return results
+
+    def append(self, results: Dict[str, Dict[str, Any]]) -> None:
+        if not results:
+            return
+        line = json.dumps({"results": results}, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def discard(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def run_key(params: Dict[str, Any]) -> str:
+    """分析結果に影響するパラメータから、実行を識別するハッシュを作る。"""
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def journal_for(file_id: str, params: Dict[str, Any]) -> AnalysisJournal:
+    """file_id と実行パラメータに対応するジャーナルを返す。"""
+    return AnalysisJournal(CHECKPOINT_DIR / f"{file_id}.{run_key(params)}.jsonl")
+
+
+def discard_all(file_id: str) -> None:
+    """file_id に関するすべてのジャーナルを削除する。"""
+    for path in CHECKPOINT_DIR.glob(f"{file_id}.*.jsonl"):
+        path.unlink(missing_ok=True)
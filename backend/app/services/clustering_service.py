@@ -0,0 +1,188 @@
+# backend/app/services/clustering_service.py
+
+import zlib
+from collections import Counter
+from typing import List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+import numpy as np
+from .dedup_service import normalize_for_dedup
+
+# 文字 n-gram をハッシュで落とし込む特徴量の次元数
+N_FEATURES = 2 ** 13
+# 日本語は単語の区切りが無いため、文字 bigram / trigram を特徴量にする
+NGRAM_RANGE = (2, 3)
+# ベクトル化・割り当てを行うチャンクのサイズ（メモリ使用量の上限を決める）
+CHUNK_SIZE = 2048
+MINI_BATCH_SIZE = 1024
+# k-means++ による初期化に使うサンプル数
+INIT_SAMPLE_SIZE = 4096
+# 所属コメントと重心の類似度のうち、この百分位点を「当てはまりの良さ」の下限とする
+SIMILARITY_FLOOR_PERCENTILE = 10
+
+
+class Cluster(NamedTuple):
+    """クラスタリング結果の1クラスタ"""
+    size: int                          # 所属するコメントの件数（重複を含む正確な件数）
+    representatives: List[str]         # 重心に近い順の代表コメント
+
+
+class ClusterModel(NamedTuple):
+    """
+    クラスタリングの結果と、新しいコメントを既存のクラスタに割り当てるための情報。
+    同じ centers・idf で assign_to_clusters を呼べば、学習時と同じ割り当てが再現される。
+    """
+    clusters: List[Cluster]            # 件数の多い順
+    centers: np.ndarray                # clusters と同じ順の重心（L2 正規化済み）
+    idf: np.ndarray
+    similarity_floor: float            # 所属コメントと重心の類似度の下限の目安
+
+
+def _ngram_features(text: str) -> np.ndarray:
+    """テキストをハッシュ化した文字 n-gram の (特徴量番号, 出現回数) の配列に変換する。"""
+    normalized = normalize_for_dedup(text) or text
+    grams = [
+        normalized[i:i + n]
+        for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1)
+        for i in range(len(normalized) - n + 1)
+    ] or [normalized]
+    hashed = np.fromiter((zlib.crc32(g.encode("utf-8")) % N_FEATURES for g in grams), dtype=np.int64, count=len(grams))
+    indices, counts = np.unique(hashed, return_counts=True)
+    return np.stack([indices, counts])
+
+
+class _TfidfMatrix:
+    """
+    文字 n-gram TF-IDF の行列。特徴量の疎表現だけを保持し、
+    密な行列はチャンク単位で必要なときに組み立てる。
+    """
+
+    def __init__(self, texts: Sequence[str], idf: Optional[np.ndarray] = None):
+        self.features = [_ngram_features(text) for text in texts]
+        if idf is not None:
+            # 学習済みの idf を使う（既存のクラスタへの割り当て）
+            self.idf = idf
+            return
+        df = np.zeros(N_FEATURES, dtype=np.float64)
+        for feature in self.features:
+            df[feature[0]] += 1
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def rows(self, indices: Sequence[int]) -> np.ndarray:
+        """指定した行の L2 正規化済み TF-IDF ベクトルを返す。"""
+        matrix = np.zeros((len(indices), N_FEATURES), dtype=np.float32)
+        for row, index in enumerate(indices):
+            feature = self.features[index]
+            matrix[row, feature[0]] = 1 + np.log(feature[1])
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
+    def chunks(self):
+        for start in range(0, len(self), CHUNK_SIZE):
+            indices = range(start, min(start + CHUNK_SIZE, len(self)))
+            yield indices, self.rows(indices)
+
+
+def _kmeans_plus_plus(sample: np.ndarray, weights: np.ndarray, k: int, rng: np.random.RandomState) -> np.ndarray:
+    """k-means++ で初期重心を選ぶ（コサイン距離）。"""
+    probabilities = weights / weights.sum()
+    centers = [sample[rng.choice(len(sample), p=probabilities)]]
+    closest = 1 - sample @ centers[0]
+    for _ in range(1, k):
+        scores = np.clip(closest, 0, None) * weights
+        if scores.sum() <= 0:
+            index = rng.choice(len(sample), p=probabilities)
+        else:
+            index = rng.choice(len(sample), p=scores / scores.sum())
+        centers.append(sample[index])
+        closest = np.minimum(closest, 1 - sample @ sample[index])
+    return np.stack(centers)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _label_all(matrix: _TfidfMatrix, centers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """全件を最も近い重心に割り当て、(ラベル, 重心とのコサイン類似度) を返す。"""
+    labels = np.empty(len(matrix), dtype=np.int64)
+    similarities = np.empty(len(matrix), dtype=np.float32)
+    for indices, rows in matrix.chunks():
+        scores = rows @ centers.T
+        chunk_labels = np.argmax(scores, axis=1)
+        labels[indices.start:indices.stop] = chunk_labels
+        similarities[indices.start:indices.stop] = scores[np.arange(len(chunk_labels)), chunk_labels]
+    return labels, similarities
+
+
+def fit_clusters(texts: Union[Sequence[str], Mapping[str, int]], num_clusters: int, num_representatives: int = 5,
+                 max_iterations: Optional[int] = None, seed: int = 0) -> Optional[ClusterModel]:
+    """
+    すべてのコメントを文字 n-gram TF-IDF ＋ ミニバッチ球面 k-means でクラスタリングする。
+    同じ本文は重み付きの1件として扱うため、重複が多くても計算量は増えない。
+    texts には本文のリストのほか、集計済みの「本文 → 件数」の辞書も渡せる。
+    コメントの種類が num_clusters 以下の場合は、各コメントをそれぞれ1つのクラスタにする。
+    コメントが無い場合は None を返す。
+    """
+    counter = Counter(texts)
+    unique_texts = list(counter)
+    if not unique_texts:
+        return None
+    weights = np.array([counter[text] for text in unique_texts], dtype=np.float64)
+    matrix = _TfidfMatrix(unique_texts)
+    n = len(unique_texts)
+
+    if n <= num_clusters:
+        centers = matrix.rows(range(n))
+    else:
+        rng = np.random.RandomState(seed)
+
+        # --- 初期化 ---
+        init_indices = np.sort(rng.choice(n, size=min(n, INIT_SAMPLE_SIZE), replace=False))
+        centers = _kmeans_plus_plus(matrix.rows(init_indices), weights[init_indices], num_clusters, rng)
+
+        # --- ミニバッチ k-means（Sculley 2010 の更新則、コサイン類似度で割り当て） ---
+        if max_iterations is None:
+            max_iterations = int(min(100, max(10, 3 * n / MINI_BATCH_SIZE)))
+        center_counts = np.zeros(num_clusters, dtype=np.float64)
+        sampling = weights / weights.sum()
+        for _ in range(max_iterations):
+            batch_indices = np.sort(rng.choice(n, size=min(n, MINI_BATCH_SIZE), replace=False, p=sampling))
+            batch = matrix.rows(batch_indices)
+            labels = np.argmax(batch @ centers.T, axis=1)
+            for cluster in np.unique(labels):
+                members = batch[labels == cluster]
+                center_counts[cluster] += len(members)
+                learning_rate = len(members) / center_counts[cluster]
+                centers[cluster] = (1 - learning_rate) * centers[cluster] + learning_rate * members.mean(axis=0)
+            centers = _normalize_rows(centers)
+
+    # --- 全件の割り当てと、重心に近いコメントの選択 ---
+    labels, similarities = _label_all(matrix, centers)
+    clusters, kept_centers = [], []
+    for cluster in range(len(centers)):
+        members = np.flatnonzero(labels == cluster)
+        if len(members) == 0:
+            continue
+        nearest = members[np.argsort(-similarities[members], kind="stable")[:num_representatives]]
+        clusters.append(Cluster(int(weights[members].sum()), [unique_texts[i] for i in nearest]))
+        kept_centers.append(centers[cluster])
+    order = sorted(range(len(clusters)), key=lambda i: clusters[i].size, reverse=True)
+    return ClusterModel(
+        clusters=[clusters[i] for i in order],
+        centers=np.stack([kept_centers[i] for i in order]).astype(np.float32),
+        idf=matrix.idf,
+        similarity_floor=float(np.percentile(similarities, SIMILARITY_FLOOR_PERCENTILE)),
+    )
+
+
+def assign_to_clusters(centers: np.ndarray, idf: np.ndarray, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """学習済みの重心に texts を割り当て、(ラベル, 重心とのコサイン類似度) を返す。"""
+    if not texts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return _label_all(_TfidfMatrix(texts, idf=idf), centers)
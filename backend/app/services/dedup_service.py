@@ -0,0 +1,112 @@
+# backend/app/services/dedup_service.py
+
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Set, Tuple
+import numpy as np
+
+# MinHash の計算に使うメルセンヌ素数
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class DedupGroups(NamedTuple):
+    """重複除去の結果"""
+    representatives: List[int]  # 各グループの代表コメントのインデックス
+    assignments: List[int]      # 各コメントが属するグループ番号（representatives の添字）
+
+
+def normalize_for_dedup(text: str) -> str:
+    """NFKC正規化・小文字化を行い、空白・句読点・制御文字を取り除く（絵文字などの記号は残す）。"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return "".join(ch for ch in text if not unicodedata.category(ch).startswith(("Z", "P", "C")) and not ch.isspace())
+
+
+def _shingles(text: str, size: int) -> Set[str]:
+    """文字 n-gram の集合。同じ n-gram が繰り返し現れる場合は出現回数ごとに区別する（「11」と「111」を同一視しない）"""
+    if len(text) <= size:
+        return {text}
+    seen: Dict[str, int] = defaultdict(int)
+    shingles = set()
+    for i in range(len(text) - size + 1):
+        gram = text[i:i + size]
+        shingles.add(f"{gram}\0{seen[gram]}")
+        seen[gram] += 1
+    return shingles
+
+
+def _lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """num_perm を bands × rows に分割する。(1/bands)^(1/rows) が閾値に最も近くなる組を選ぶ。"""
+    best = (num_perm, 1)
+    best_error = float("inf")
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class MinHasher:
+    """文字 n-gram の集合から MinHash 署名を計算する（シードを固定しているので結果は実行ごとに同じ）"""
+
+    def __init__(self, num_perm: int, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64) % _MERSENNE_PRIME
+        self.b = rng.randint(0, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64) % _MERSENNE_PRIME
+
+    def signature(self, shingles: Set[str]) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=1)
+
+
+def group_near_duplicates(texts: List[str], threshold: float = 0.9, num_perm: int = 64,
+                          shingle_size: int = 2) -> DedupGroups:
+    """
+    完全一致（正規化後）とほぼ同一のコメントをグループにまとめる。
+    正規化後の文字列が一致するものはそのまま同じグループにし、
+    残りは MinHash/LSH で候補を絞ってから、代表コメントとの Jaccard 係数が threshold 以上なら同じグループに入れる。
+    グループの代表は、そのグループで最初に出現したコメント。
+    """
+    representatives: List[int] = []
+    assignments: List[int] = []
+    group_by_normalized: Dict[str, int] = {}
+    rep_shingles: List[Set[str]] = []
+
+    bands, rows = _lsh_params(threshold, num_perm)
+    hasher = MinHasher(num_perm)
+    buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+
+    for index, text in enumerate(texts):
+        normalized = normalize_for_dedup(text)
+        group = group_by_normalized.get(normalized)
+        if group is not None:
+            assignments.append(group)
+            continue
+
+        shingles = _shingles(normalized, shingle_size)
+        signature = hasher.signature(shingles)
+        band_keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(bands)]
+
+        # LSH で見つかった候補グループの代表と実際の Jaccard 係数を比べる
+        for candidate in dict.fromkeys(g for key in band_keys for g in buckets.get(key, ())):
+            candidate_shingles = rep_shingles[candidate]
+            jaccard = len(shingles & candidate_shingles) / len(shingles | candidate_shingles)
+            if jaccard >= threshold:
+                group = candidate
+                break
+
+        if group is None:
+            group = len(representatives)
+            representatives.append(index)
+            rep_shingles.append(shingles)
+            for key in band_keys:
+                buckets[key].append(group)
+        group_by_normalized[normalized] = group
+        assignments.append(group)
+
+    return DedupGroups(representatives, assignments)
@@ -0,0 +1,223 @@
+# backend/app/services/dispatch_service.py
+
+import contextvars
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Iterable, List, Optional, Tuple, TypeVar
+from app.core.config import settings
+from app.core import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class TokenBucket:
+    """一定速度で補充されるトークンバケット（スレッドセーフ）"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_second)
+        self._updated_at = now
+
+    def acquire(self, amount: float = 1.0) -> None:
+        """amount 分のトークンが貯まるまで待ってから消費する。"""
+        # バケット容量を超える要求は永遠に満たされないため、容量に丸める
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.refill_per_second
+            time.sleep(wait)
+
+    def debit(self, amount: float) -> None:
+        """実際の消費量が見積もりを上回った場合に、差分を後から差し引く（負になってもよい）。"""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+
+class RateLimiter:
+    """1分あたりのリクエスト数とトークン数の両方を制限する"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """クォータ超過を受けたとき、すべての呼び出しを seconds 秒止める（各スレッドが個別に叩き続けないようにする）。"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self, estimated_tokens: int) -> None:
+        while True:
+            with self._lock:
+                wait = self._paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        self.requests.acquire(1)
+        self.tokens.acquire(estimated_tokens)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        if actual_tokens is not None and actual_tokens > estimated_tokens:
+            self.tokens.debit(actual_tokens - estimated_tokens)
+
+
+# プロセス全体で共有するレートリミッター
+rate_limiter = RateLimiter(settings.LLM_REQUESTS_PER_MINUTE, settings.LLM_TOKENS_PER_MINUTE)
+
+_RETRY_DELAY_PATTERN = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """429 / クォータ超過系のエラーかどうかを判定する。"""
+    if getattr(exc, "code", None) == 429:
+        return True
+    message = str(exc).lower()
+    return "429" in message or "quota" in message or "rate limit" in message or "resource exhausted" in message
+
+
+def _backoff_delay(attempt: int, exc: Exception) -> float:
+    """指数バックオフ＋フルジッターの待ち時間を計算する。"""
+    delay = min(settings.LLM_BACKOFF_MAX_SECONDS, settings.LLM_BACKOFF_BASE_SECONDS * (2 ** attempt))
+    delay = random.uniform(0, delay)
+    if is_rate_limit_error(exc):
+        # サーバーが待ち時間を指示している場合はそれを下限とする
+        match = _RETRY_DELAY_PATTERN.search(str(exc))
+        if match:
+            delay = max(delay, float(match.group(1)))
+        else:
+            delay = max(delay, settings.LLM_BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return delay
+
+
+def call_with_backoff(fn: Callable[[], R], estimated_tokens: int = 0,
+                      usage_of: Optional[Callable[[R], Optional[int]]] = None, task: str = "llm") -> R:
+    """
+    レート制限を守りながら fn を呼び出し、失敗した場合は指数バックオフでリトライする。
+    すべてのリトライに失敗した場合は最後の例外を送出する。
+    リトライと最終的な失敗は task ごとにメトリクスへ記録する。
+    """
+    max_retries = settings.LLM_MAX_RETRIES
+    attempt = 0
+    while True:
+        rate_limiter.acquire(estimated_tokens)
+        try:
+            result = fn()
+        except Exception as e:
+            if attempt >= max_retries:
+                metrics.record_llm_failure(task, "exhausted")
+                raise
+            delay = _backoff_delay(attempt, e)
+            rate_limited = is_rate_limit_error(e)
+            metrics.record_llm_retry(task, "rate_limit" if rate_limited else "error")
+            kind = "Rate limited" if rate_limited else "LLM API call failed"
+            print(f"{kind} (Attempt {attempt + 1}/{max_retries + 1}): {e}. Retrying in {delay:.1f}s...")
+            if rate_limited:
+                # クォータはプロセス全体で共有しているので、他のスレッドの呼び出しもまとめて待たせる
+                rate_limiter.pause(delay)
+            time.sleep(delay)
+            attempt += 1
+            continue
+        if usage_of is not None:
+            rate_limiter.record_usage(estimated_tokens, usage_of(result))
+        return result
+
+
+def map_ordered(fn: Callable[[T], R], items: Iterable[T], max_in_flight: Optional[int] = None) -> List[R]:
+    """
+    items の各要素に fn を並列に適用し、入力と同じ順序で結果を返す。
+    同時実行数は max_in_flight（省略時は設定値）で制限される。
+    呼び出し元のコンテキスト（実行中の RunProfile など）はワーカースレッドにも引き継がれる。
+    """
+    items = list(items)
+    if not items:
+        return []
+    max_workers = max(1, min(max_in_flight or settings.LLM_MAX_CONCURRENCY, len(items)))
+    if max_workers == 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-dispatch") as executor:
+        # Context は複数スレッドで同時に使えないため、要素ごとにコピーする
+        futures = [executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+
+class FairScheduler:
+    """
+    プロセス全体で共有する、固定数のワーカーによるLLMバッチのスケジューラ。
+    タスクは依頼元（テナント: 分析結果・ファイルなど）ごとのキューに入り、ワーカーはテナントを順番に回って
+    1件ずつ取り出す（ラウンドロビン）。大きなファイルがあっても、他のファイルのバッチが後回しにされ続けることはない。
+    """
+
+    def __init__(self, workers: int):
+        self._queues: "OrderedDict[str, Deque[Tuple[Future, Callable, Any, contextvars.Context]]]" = OrderedDict()
+        self._cond = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"llm-scheduler-{i}", daemon=True).start()
+
+    def submit(self, tenant: str, fn: Callable[[T], R], item: T) -> "Future[R]":
+        future: "Future[R]" = Future()
+        with self._cond:
+            self._queues.setdefault(tenant, deque()).append((future, fn, item, contextvars.copy_context()))
+            self._cond.notify()
+        return future
+
+    def map(self, tenant: str, fn: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """
+        items の各要素に fn を適用するタスクを tenant のキューに入れ、入力と同じ順序で結果を返す。
+        いずれかが例外を送出した場合は、まだ始まっていないタスクを取り消してその例外を送出する。
+        """
+        futures = [self.submit(tenant, fn, item) for item in items]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def _next(self):
+        with self._cond:
+            while not self._queues:
+                self._cond.wait()
+            tenant, queue = self._queues.popitem(last=False)
+            task = queue.popleft()
+            if queue:
+                # 次のタスクは他のテナントの後に回す
+                self._queues[tenant] = queue
+            return task
+
+    def _worker(self) -> None:
+        while True:
+            future, fn, item, context = self._next()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(context.run(fn, item))
+            except BaseException as e:
+                future.set_exception(e)
+
+
+# すべての分析ジョブのLLMバッチが通る共有スケジューラ。同時実行数はプロセス全体で LLM_MAX_CONCURRENCY になる
+llm_scheduler = FairScheduler(settings.LLM_MAX_CONCURRENCY)
+
+
+def run_parallel(*calls: Callable[[], Any]) -> List[Any]:
+    """引数なしの呼び出しを並列に実行し、渡した順で結果を返す。"""
+    return map_ordered(lambda call: call(), calls, max_in_flight=len(calls))
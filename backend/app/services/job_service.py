@@ -0,0 +1,145 @@
+# backend/app/services/job_service.py
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from app.core.config import settings
+from .analysis_service import AnalysisCancelled
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATUSES = {COMPLETED, FAILED, CANCELLED}
+
+
+class Job:
+    """バックグラウンドで実行される1件の分析ジョブ"""
+
+    def __init__(self, params: Dict[str, Any]):
+        self.id = str(uuid.uuid4())
+        self.params = params
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.batches_completed = 0
+        self.batches_total = 0
+        self.error: Optional[str] = None
+        self.result: Any = None
+        self.cancel_event = threading.Event()
+        # 状態が変わるたびに増える番号。SSE で変化を検知するのに使う
+        self.version = 0
+        self._lock = threading.Lock()
+        self._progress_started_at: Optional[float] = None
+
+    def _touch(self) -> None:
+        self.version += 1
+
+    def report_progress(self, completed: int, total: int) -> None:
+        with self._lock:
+            if self._progress_started_at is None:
+                self._progress_started_at = time.time()
+            self.batches_completed = completed
+            self.batches_total = total
+            self._touch()
+
+    def eta_seconds(self) -> Optional[float]:
+        """完了済みバッチの処理速度から残り時間を見積もる。"""
+        if self.status != RUNNING or not self.batches_completed or self._progress_started_at is None:
+            return None
+        elapsed = time.time() - self._progress_started_at
+        remaining = self.batches_total - self.batches_completed
+        return round(elapsed / self.batches_completed * remaining, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "batches_completed": self.batches_completed,
+                "batches_total": self.batches_total,
+                "eta_seconds": self.eta_seconds(),
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """ワーカープールでジョブを実行し、状態を保持する"""
+
+    def __init__(self, max_workers: int, retention_seconds: int):
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[[Job], Any], params: Dict[str, Any]) -> Job:
+        """fn(job) をワーカーで実行するジョブを登録し、すぐに返す。"""
+        self._prune()
+        job = Job(params)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with job._lock:
+            if job.status not in TERMINAL_STATUSES:
+                job.cancel_event.set()
+                if job.status == QUEUED:
+                    # まだ開始していないジョブはその場で取り消す
+                    job.status = CANCELLED
+                    job.finished_at = time.time()
+                job._touch()
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        with job._lock:
+            if job.cancel_event.is_set():
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+            job._touch()
+        try:
+            result = fn(job)
+        except AnalysisCancelled:
+            status, result, error = CANCELLED, None, None
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            status, result, error = FAILED, None, str(e)
+        else:
+            status, error = COMPLETED, None
+        with job._lock:
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            job._touch()
+
+    def _prune(self) -> None:
+        """保持期間を過ぎた終了済みジョブを削除する。"""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.status in TERMINAL_STATUSES and job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+job_manager = JobManager(settings.JOB_WORKERS, settings.JOB_RETENTION_SECONDS)
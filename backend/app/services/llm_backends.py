@@ -0,0 +1,178 @@
+# backend/app/services/llm_backends.py
+
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import Iterator, List, NamedTuple, Optional
+from app.core.config import settings
+
+# llm_service からの呼び出しの種類。フェイク実装はこれを見て返す JSON の形を決める
+TASK_ANALYZE_BATCH = "analyze_batch"
+TASK_NAME_THEME = "name_theme"
+TASK_REPORT = "report"
+
+
+class LLMResponse(NamedTuple):
+    """LLM呼び出しの結果"""
+    text: str
+    prompt_tokens: Optional[int] = None
+    response_tokens: Optional[int] = None
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        if self.prompt_tokens is None or self.response_tokens is None:
+            return None
+        return self.prompt_tokens + self.response_tokens
+
+
+class LLMBackend(ABC):
+    """llm_service が使うLLMの呼び出し口"""
+
+    model_name: str
+
+    @abstractmethod
+    def generate(self, prompt: str, task: str, json_response: bool = False) -> LLMResponse:
+        """プロンプトを送り、応答テキストを返す。失敗した場合は例外を送出する。"""
+
+    def generate_stream(self, prompt: str, task: str) -> Iterator[LLMResponse]:
+        """
+        応答をテキストの断片ごとに返す。トークン数は最後の要素にだけ入る。
+        ストリーミングに対応しないバックエンドは、応答全体を1つの断片として返す。
+        """
+        yield self.generate(prompt, task)
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini API を使う本番用の実装"""
+
+    def __init__(self, model_name: str, api_key: str):
+        import google.generativeai as genai
+
+        self._genai = genai
+        self.model_name = model_name
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, task: str, json_response: bool = False) -> LLMResponse:
+        generation_config = None
+        if json_response:
+            generation_config = self._genai.types.GenerationConfig(response_mime_type="application/json")
+        response = self._model.generate_content(prompt, generation_config=generation_config)
+        usage = getattr(response, "usage_metadata", None)
+        return LLMResponse(
+            response.text,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            response_tokens=getattr(usage, "candidates_token_count", None),
+        )
+
+    def generate_stream(self, prompt: str, task: str) -> Iterator[LLMResponse]:
+        usage = None
+        for chunk in self._model.generate_content(prompt, stream=True):
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield LLMResponse(chunk.text)
+        yield LLMResponse(
+            "",
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            response_tokens=getattr(usage, "candidates_token_count", None),
+        )
+
+
+class FakeLLMError(Exception):
+    """フェイク実装が意図的に発生させるエラー"""
+
+
+class FakeBackend(LLMBackend):
+    """
+    ネットワークもAPIキーも使わない、決定的なローカル実装。
+    スキーマどおりのJSONを返し、遅延・エラー率・件数不一致率を設定できる。
+    ベンチマークや回帰テストでパイプラインのスループットを測るために使う。
+    """
+
+    model_name = "fake-llm"
+
+    _SENTIMENTS = ["positive", "negative", "neutral"]
+    _CATEGORIES = ["講義内容", "講義資料", "運営", "その他"]
+    _COMMENT_PATTERN = re.compile(r"^\s*(\d+)\. 「(.*?)」$", re.MULTILINE | re.DOTALL)
+    STREAM_CHUNK_SIZE = 8
+
+    def __init__(self, latency_seconds: float = 0.0, error_rate: float = 0.0, mismatch_rate: float = 0.0,
+                 seed: int = 0):
+        self.latency_seconds = latency_seconds
+        self.error_rate = error_rate
+        self.mismatch_rate = mismatch_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.latencies: List[float] = []
+
+    def _roll(self, rate: float) -> bool:
+        with self._lock:
+            return self._random.random() < rate
+
+    def generate(self, prompt: str, task: str, json_response: bool = False) -> LLMResponse:
+        started = time.perf_counter()
+        with self._lock:
+            self.calls += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        try:
+            if self._roll(self.error_rate):
+                raise FakeLLMError("503 Service Unavailable (fake)")
+            if task == TASK_ANALYZE_BATCH:
+                text = self._analyze_batch(prompt)
+            elif task == TASK_NAME_THEME:
+                text = json.dumps({"theme": self._theme_name(prompt)}, ensure_ascii=False)
+            else:
+                text = "## 講義アンケート分析レポート\n\n（フェイクのレポートです）"
+            return LLMResponse(text, prompt_tokens=len(prompt), response_tokens=len(text))
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - started)
+
+    def generate_stream(self, prompt: str, task: str) -> Iterator[LLMResponse]:
+        # 遅延は最初の断片までにかかるものとし、残りは STREAM_CHUNK_SIZE 文字ずつすぐに返す
+        response = self.generate(prompt, task)
+        for start in range(0, len(response.text), self.STREAM_CHUNK_SIZE):
+            yield LLMResponse(response.text[start:start + self.STREAM_CHUNK_SIZE])
+        yield LLMResponse("", prompt_tokens=response.prompt_tokens, response_tokens=response.response_tokens)
+
+    def _analyze_batch(self, prompt: str) -> str:
+        results = []
+        for item_id, comment in self._COMMENT_PATTERN.findall(prompt):
+            # 同じコメントには常に同じ結果を返す
+            digest = zlib.crc32(comment.encode("utf-8"))
+            results.append({
+                "id": int(item_id),
+                "sentiment": self._SENTIMENTS[digest % 3],
+                "category": self._CATEGORIES[(digest // 3) % 4],
+                "score": digest % 10 + 1,
+                "summary": comment[:20],
+                "is_critical": digest % 97 == 0,
+            })
+        if results and self._roll(self.mismatch_rate):
+            with self._lock:
+                del results[self._random.randrange(len(results))]
+        return json.dumps(results, ensure_ascii=False)
+
+    @staticmethod
+    def _theme_name(prompt: str) -> str:
+        match = re.search(r"^\s*- (.+)$", prompt, re.MULTILINE)
+        return match.group(1)[:15] if match else "テーマ"
+
+
+def create_backend(name: str) -> LLMBackend:
+    """設定値からバックエンドを作る。"""
+    if name == "gemini":
+        return GeminiBackend(settings.GEMINI_MODEL, settings.GEMINI_API_KEY)
+    if name == "fake":
+        return FakeBackend(
+            latency_seconds=settings.FAKE_LLM_LATENCY_SECONDS,
+            error_rate=settings.FAKE_LLM_ERROR_RATE,
+            mismatch_rate=settings.FAKE_LLM_MISMATCH_RATE,
+            seed=settings.FAKE_LLM_SEED,
+        )
+    raise ValueError(f"未知のLLMバックエンドです: '{name}'（'gemini' または 'fake' を指定してください）")
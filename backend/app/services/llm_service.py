@@ -1,33 +1,28 @@
 # backend/app/services/llm_service.py
 
-import google.generativeai as genai
 from app.core.config import settings
+from app.core import metrics
+import hashlib
+import itertools
 import json
 import time
-from typing import List, Dict, Any
+from typing import Iterator, List, Dict, Any, Optional
+from . import dispatch_service, clustering_service, llm_backends
+from .llm_backends import LLMResponse, TASK_ANALYZE_BATCH, TASK_NAME_THEME, TASK_REPORT
 
-# APIキーの設定
-genai.configure(api_key=settings.GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash-latest')
+# 設定に応じたバックエンド（Gemini またはローカルのフェイク）
+backend = llm_backends.create_backend(settings.LLM_BACKEND)
+MODEL_NAME = backend.model_name
 
-def analyze_comments_in_batch(comments: List[str]) -> List[Dict[str, Any]]:
-    """
-    複数のコメントをバッチ処理で分析し、結果の辞書のリストを返す。
-    """
-    if not comments:
-        return []
-
-    # LLMに入力するコメントリストを整形
-    formatted_comments = "\n".join([f'{i+1}. 「{comment}」' for i, comment in enumerate(comments)])
-
-    # バッチ処理用の新しいプロンプト
-    prompt = f"""
+# バッチ処理用のプロンプト
+BATCH_ANALYSIS_PROMPT = """
     以下のカスタマーレビューのリストを分析し、各レビューに対する分析結果をJSONオブジェクトの配列（リスト）として返してください。
 
     レビューリスト:
     {formatted_comments}
 
     各レビューについて、以下の項目を分析してください:
+    0. id: レビューリストの先頭に付いている番号（整数）をそのまま記載。
     1. sentiment: レビューの感情を "positive", "negative", "neutral" のいずれかで分類。
     2. category: レビューの主題を "講義内容", "講義資料", "運営", "その他" のいずれかで分類。
     3. score: フィードバックの重要度を1から10の整数で評価（10が最も重要）。
@@ -35,90 +30,174 @@ def analyze_comments_in_batch(comments: List[str]) -> List[Dict[str, Any]]:
     5. is_critical: 誹謗中傷、個人攻撃、緊急対応が必要な内容が含まれる場合はtrue、そうでなければfalse。
 
     出力は必ず、入力されたレビューリストの順番に対応したJSONオブジェクトの配列のみとしてください。
-    例: [{{ "sentiment": "...", "category": "...", ... }}, {{ "sentiment": "...", "category": "...", ... }}]
+    例: [{{ "id": 1, "sentiment": "...", "category": "...", ... }}, {{ "id": 2, "sentiment": "...", "category": "...", ... }}]
     """
 
-    for i in range(3):  # 3回までリトライ
+# プロンプトの内容から導出するバージョン。プロンプトを変更すると自動的に変わり、
+# 以前のプロンプトで得た分析結果のキャッシュは使われなくなる。
+PROMPT_VERSION = hashlib.sha256(BATCH_ANALYSIS_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+def estimate_tokens(text: str) -> int:
+    """
+    トークン数の概算。日本語は1文字あたりおおよそ1トークン前後になるため、
+    文字数をそのまま上限寄りの見積もりとして使う。
+    """
+    return len(text)
+
+# 1件の分析結果（JSON）の出力に必要なトークン数の目安
+OUTPUT_TOKENS_PER_COMMENT = 60
+
+def estimate_comment_tokens(comment: str) -> int:
+    """バッチに1件のコメントを加えたときに増える入出力トークン数の目安"""
+    return estimate_tokens(comment) + OUTPUT_TOKENS_PER_COMMENT
+
+def _generate(prompt: str, task: str, json_response: bool = False) -> LLMResponse:
+    """レート制限とバックオフ付きでバックエンドを呼び出す。各試行の時間とトークン数はメトリクスに記録する。"""
+    def attempt() -> LLMResponse:
+        started = time.perf_counter()
         try:
-            response = model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(response_mime_type="application/json")
-            )
-            # JSON文字列をPythonのリストに変換
-            results_list = json.loads(response.text)
-            
-            # 結果の件数が入力と一致するか確認
-            if isinstance(results_list, list) and len(results_list) == len(comments):
-                return results_list
-            else:
-                print(f"Warning: LLM response count mismatch. Expected {len(comments)}, got {len(results_list)}. Retrying...")
-        
-        except Exception as e:
-            print(f"LLM API batch call failed (Attempt {i+1}/3): {e}")
-            time.sleep(2) # 2秒待ってリトライ
-    
-    # すべてのリトライが失敗した場合
-    print("Error: LLM batch analysis failed after all retries.")
-    # 後続の処理でエラーが出ないように、入力と同じ数の空の辞書を返す
-    return [{} for _ in comments]
+            response = backend.generate(prompt, task, json_response=json_response)
+        except Exception:
+            metrics.record_llm_call(task, time.perf_counter() - started, succeeded=False)
+            raise
+        metrics.record_llm_call(task, time.perf_counter() - started, succeeded=True,
+                                prompt_tokens=response.prompt_tokens, response_tokens=response.response_tokens)
+        return response
+
+    return dispatch_service.call_with_backoff(
+        attempt,
+        estimated_tokens=estimate_tokens(prompt),
+        usage_of=lambda response: response.total_tokens,
+        task=task,
+    )
+
+def _is_valid_result(item: Any) -> bool:
+    return isinstance(item, dict) and item.get("sentiment") in ("positive", "negative", "neutral")
 
-def cluster_and_summarize_comments(comments: List[str], num_clusters: int = 7) -> List[Dict[str, Any]]:
+def _analyze_once(comments: List[str]) -> List[Optional[Dict[str, Any]]]:
     """
-    コメントのリストを受け取り、似た内容でグルーピングして要約する。
+    1回のLLM呼び出しでコメントを分析する。結果は "id" で入力と対応付けるため、
+    一部の項目が欠けた応答でも得られた分は使える。対応する結果が無い項目は None になる。
     """
-    if not comments or len(comments) < num_clusters:
-        # コメントが少ない場合は単純なリストとして返す
-        return [{"theme": comment, "count": 1, "representative_comment": comment} for comment in comments]
+    # LLMに入力するコメントリストを整形（先頭の番号がそのまま id になる）
+    formatted_comments = "\n".join([f'{i+1}. 「{comment}」' for i, comment in enumerate(comments)])
+    prompt = BATCH_ANALYSIS_PROMPT.format(formatted_comments=formatted_comments)
+
+    response = _generate(prompt, TASK_ANALYZE_BATCH, json_response=True)
+    try:
+        results_list = json.loads(response.text)
+    except json.JSONDecodeError as e:
+        print(f"Warning: Failed to parse LLM response as JSON: {e}")
+        return [None] * len(comments)
+    if not isinstance(results_list, list):
+        print("Warning: LLM response is not a JSON array.")
+        return [None] * len(comments)
 
-    # プロンプトが長くなりすぎないように、最大500件程度に絞る
-    comments_to_process = comments[:500]
-    
-    formatted_comments = "\n".join([f"- {comment}" for comment in comments_to_process])
+    results: List[Optional[Dict[str, Any]]] = [None] * len(comments)
+    has_ids = False
+    for item in results_list:
+        if not _is_valid_result(item):
+            continue
+        item_id = item.pop("id", None)
+        if isinstance(item_id, int) and 1 <= item_id <= len(comments):
+            has_ids = True
+            results[item_id - 1] = item
+    if not has_ids and len(results_list) == len(comments):
+        # id が返ってこなかった場合でも、件数が一致していれば順番で対応付ける
+        results = [item if _is_valid_result(item) else None for item in results_list]
+    return results
+
+def analyze_comments_in_batch(comments: List[str], max_single_attempts: int = 3) -> List[Dict[str, Any]]:
+    """
+    複数のコメントをバッチ処理で分析し、結果の辞書のリストを返す。
+    応答の件数が合わない・JSONが壊れているなどで結果が欠けた場合は、欠けた項目だけを二分割して再試行する。
+    1件にまで絞っても max_single_attempts 回失敗した項目は空の辞書になる。
+    呼び出し自体の失敗（バックオフでも回復しなかったもの）は分割しても同じく失敗するだけなので再試行しない。
+    クォータ超過はそのまま例外を送出し、それ以外はそのバッチの項目をすべて空の辞書にする。
+    """
+    results: List[Dict[str, Any]] = [{} for _ in comments]
+
+    def solve(indices: List[int], attempt: int) -> None:
+        try:
+            partial = _analyze_once([comments[i] for i in indices])
+        except Exception as e:
+            if dispatch_service.is_rate_limit_error(e):
+                raise
+            print(f"LLM API batch call failed ({len(indices)} comments): {e}")
+            return
+
+        missing = []
+        for index, result in zip(indices, partial):
+            if result is None:
+                missing.append(index)
+            else:
+                results[index] = result
+        if not missing:
+            return
+
+        if len(missing) == 1:
+            if attempt + 1 < max_single_attempts:
+                solve(missing, attempt + 1)
+            else:
+                metrics.record_llm_failure(TASK_ANALYZE_BATCH, "missing_result")
+                print(f"Error: LLM analysis failed for a comment after {max_single_attempts} attempts: 「{comments[missing[0]][:40]}」")
+            return
+        print(f"Warning: {len(missing)} of {len(indices)} results missing. Retrying in two halves...")
+        mid = len(missing) // 2
+        solve(missing[:mid], 0)
+        solve(missing[mid:], 0)
+
+    if comments:
+        solve(list(range(len(comments))), 0)
+    return results
+
+def name_theme(representative_comments: List[str]) -> str:
+    """
+    同じクラスタに属する代表コメントから、テーマを表す短いタイトルを生成する。
+    """
+    formatted_comments = "\n".join([f"- {comment}" for comment in representative_comments])
 
     prompt = f"""
-    以下のコメントリストを分析し、内容が類似するコメントを{num_clusters}個の主要なテーマに分類・集約してください。
+    以下は、内容が類似しているとして1つのグループにまとめられたコメントです。
 
     コメントリスト:
     {formatted_comments}
 
-    各テーマについて、以下の情報を含むJSONオブジェクトの配列を生成してください。
-    1. "theme": そのテーマを表す簡潔なタイトル（例：「資料の分かりやすさ」「課題の難易度」）。
-    2. "count": そのテーマに合致するコメントのおおよその件数。
-    3. "representative_comment": そのテーマを最もよく表している代表的なコメントを一つ選んでください。
-
-    出力はJSONオブジェクトの配列のみとしてください。
-    例: [{{ "theme": "...", "count": ..., "representative_comment": "..." }}, ...]
+    このグループのテーマを表す簡潔なタイトル（例：「資料の分かりやすさ」「課題の難易度」）を1つ付けてください。
+    出力は {{ "theme": "..." }} の形式のJSONオブジェクトのみとしてください。
     """
     try:
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(response_mime_type="application/json")
-        )
-        return json.loads(response.text)
+        response = _generate(prompt, TASK_NAME_THEME, json_response=True)
+        theme = json.loads(response.text).get("theme")
+        if theme:
+            return str(theme)
     except Exception as e:
-        print(f"Error during comment clustering: {e}")
-        return []
+        print(f"Error during theme naming: {e}")
+    # 命名に失敗した場合は代表コメントをそのままテーマとして使う
+    return representative_comments[0][:30]
 
-def generate_narrative_report(dashboard_data: Dict[str, Any]) -> str:
+def summarize_clusters(clusters: List[clustering_service.Cluster], tenant: str,
+                       name_with_llm: bool = True) -> List[Dict[str, Any]]:
     """
-    ダッシュボードデータを受け取り、自然言語のレポートを生成する。
+    クラスタごとに、LLMで付けたテーマ名・件数・代表コメントをまとめる。
+    テーマ名の生成は分析バッチと同じ共有スケジューラの tenant のキューに入る。
+    name_with_llm が False の場合（コメントの種類が少なく、各コメントがそのままクラスタになっている場合）は
+    代表コメントをそのままテーマとして使う。
     """
-    # LLMに渡すために、データを簡潔なテキスト形式に変換
-    summary = dashboard_data.get('summary', {})
-    report_text = f"""
-分析サマリー:
-- 総コメント数: {summary.get('totalComments', 0)}件
-- ポジティブな意見: {summary.get('positiveCount', 0)}件
-- ネガティブな意見: {summary.get('negativeCount', 0)}件
+    if not name_with_llm:
+        return [
+            {"theme": cluster.representatives[0], "count": cluster.size, "representative_comment": cluster.representatives[0]}
+            for cluster in clusters
+        ]
 
-ポジティブな意見の主なテーマ:
-{ "、".join([t['theme'] for t in dashboard_data.get('topPositiveThemes', [])]) }
-
-改善に関する意見の主なテーマ:
-{ "、".join([t['theme'] for t in dashboard_data.get('topNegativeThemes', [])]) }
-    """
+    themes = dispatch_service.llm_scheduler.map(tenant, lambda cluster: name_theme(cluster.representatives), clusters)
+    return [
+        {"theme": theme, "count": cluster.size, "representative_comment": cluster.representatives[0]}
+        for theme, cluster in zip(themes, clusters)
+    ]
 
-    prompt = f"""
+# レポート生成用のプロンプト。{report_text} には report_prompt_fields から組み立てたサマリーが入る
+REPORT_PROMPT = """
 あなたは大学の講義改善を支援する優秀なアシスタントです。
 以下のアンケート分析のサマリーデータを基に、講義の担当者へ報告するための簡潔なレポートを作成してください。
 
@@ -144,10 +223,80 @@ def generate_narrative_report(dashboard_data: Dict[str, Any]) -> str:
 - （ここに改善点を記述）
 - （ここに改善点を記述）
     """
-    
+
+REPORT_PROMPT_VERSION = hashlib.sha256(REPORT_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+def report_prompt_fields(dashboard_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    ダッシュボードデータのうち、レポートのプロンプトに実際に使う項目（件数とテーマ名）だけを取り出す。
+    レポートのキャッシュキーもこの値から作る。
+    """
+    summary = dashboard_data.get('summary') or {}
+    return {
+        "totalComments": summary.get('totalComments', 0),
+        "positiveCount": summary.get('positiveCount', 0),
+        "negativeCount": summary.get('negativeCount', 0),
+        "positiveThemes": [t['theme'] for t in dashboard_data.get('topPositiveThemes') or []],
+        "negativeThemes": [t['theme'] for t in dashboard_data.get('topNegativeThemes') or []],
+    }
+
+def build_report_prompt(fields: Dict[str, Any]) -> str:
+    # LLMに渡すために、データを簡潔なテキスト形式に変換
+    report_text = f"""
+分析サマリー:
+- 総コメント数: {fields['totalComments']}件
+- ポジティブな意見: {fields['positiveCount']}件
+- ネガティブな意見: {fields['negativeCount']}件
+
+ポジティブな意見の主なテーマ:
+{ "、".join(fields['positiveThemes']) }
+
+改善に関する意見の主なテーマ:
+{ "、".join(fields['negativeThemes']) }
+    """
+    return REPORT_PROMPT.format(report_text=report_text)
+
+def _generate_stream(prompt: str, task: str) -> Iterator[str]:
+    """
+    バックエンドのストリーミング応答をテキストの断片として順に返す。
+    最初の断片を受け取るまではレート制限・バックオフ付きでリトライするが、
+    出力を始めた後に失敗した場合は、重複した出力を避けるためリトライせずに例外を送出する。
+    """
+    estimated_tokens = estimate_tokens(prompt)
+    attempt_started = 0.0
+
+    def open_stream():
+        nonlocal attempt_started
+        attempt_started = time.perf_counter()
+        stream = backend.generate_stream(prompt, task)
+        try:
+            first = next(stream, None)
+        except Exception:
+            metrics.record_llm_call(task, time.perf_counter() - attempt_started, succeeded=False)
+            raise
+        return stream, first
+
+    stream, first = dispatch_service.call_with_backoff(open_stream, estimated_tokens=estimated_tokens, task=task)
+    prompt_tokens = response_tokens = None
     try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        print(f"Error during report generation: {e}")
-        return "レポートの生成中にエラーが発生しました。"
\ No newline at end of file
+        for part in itertools.chain([first] if first is not None else [], stream):
+            if part.prompt_tokens is not None:
+                prompt_tokens, response_tokens = part.prompt_tokens, part.response_tokens
+            if part.text:
+                yield part.text
+    except Exception:
+        metrics.record_llm_call(task, time.perf_counter() - attempt_started, succeeded=False)
+        raise
+    metrics.record_llm_call(task, time.perf_counter() - attempt_started, succeeded=True,
+                            prompt_tokens=prompt_tokens, response_tokens=response_tokens)
+    if prompt_tokens is not None and response_tokens is not None:
+        dispatch_service.rate_limiter.record_usage(estimated_tokens, prompt_tokens + response_tokens)
+
+def stream_narrative_report(dashboard_data: Dict[str, Any]) -> Iterator[str]:
+    """
+    ダッシュボードデータを受け取り、自然言語のレポートを生成しながら断片ごとに返す。
+    失敗した場合は例外を送出する。
+    """
+    prompt = build_report_prompt(report_prompt_fields(dashboard_data))
+    with metrics.span("report"):
+        yield from _generate_stream(prompt, TASK_REPORT)
@@ -1,25 +1,256 @@
 # backend/app/services/preprocessing_service.py
 
+import codecs
+import csv
+import json
 import pandas as pd
-from typing import IO
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Sequence, Union
 
-def preprocess_csv(file: IO[bytes], column_name: str) -> pd.DataFrame:
+# 試行する文字コードのリスト（BOM付きUTF-8を先に判定する）
+ENCODINGS_TO_TRY = ['utf-8-sig', 'utf-8', 'cp932', 'shift_jis']
+
+# 文字コード・区切り文字の判定に使う先頭サンプルのサイズ
+SAMPLE_SIZE = 64 * 1024
+
+# 区切り文字の推定に使うサンプルの文字数。csv.Sniffer は入力が長いと極端に遅くなるため、先頭の数行に限る
+SNIFF_SIZE = 4096
+
+# 再スキャン時にディスクから読み込むチャンクサイズ
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def detect_encoding(sample: bytes, candidates: Optional[List[str]] = None) -> Optional[str]:
+    """
+    先頭サンプルをデコードできる最初の文字コードを返す。
+    サンプル末尾で途切れたマルチバイト文字はエラーにしない。
+    """
+    for encoding in candidates or ENCODINGS_TO_TRY:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def sniff_dialect(sample_text: str) -> Dict[str, str]:
+    """先頭サンプルから区切り文字と引用符を推定する。判定できなければ標準的なCSVとみなす。"""
+    sample_text = sample_text[:SNIFF_SIZE]
+    if "\n" in sample_text:
+        # 途中で切れた最終行は推定を狂わせるので除く
+        sample_text = sample_text[:sample_text.rindex("\n")]
+    try:
+        dialect = csv.Sniffer().sniff(sample_text, delimiters=",\t;")
+        return {"delimiter": dialect.delimiter, "quotechar": dialect.quotechar or '"'}
+    except csv.Error:
+        return {"delimiter": ",", "quotechar": '"'}
+
+
+class _RecordCounter:
+    """
+    デコード済みのテキストを少しずつ受け取り、ヘッダーと空でない行数を数える。
+    引用符の内側の改行を考慮し、レコードが完結した時点で csv で解析する。
+    """
+
+    def __init__(self, delimiter: str, quotechar: str):
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+        self.headers: Optional[List[str]] = None
+        self.total_rows = 0
+        self._partial_line = ""
+        self._record_lines: List[str] = []
+        self._in_quotes = False
+
+    def feed(self, text: str, final: bool = False) -> None:
+        lines = (self._partial_line + text).split("\n")
+        self._partial_line = "" if final else lines.pop()
+        records = []
+        for line in lines:
+            self._record_lines.append(line)
+            if line.count(self.quotechar) % 2:
+                self._in_quotes = not self._in_quotes
+            if not self._in_quotes:
+                records.append("\n".join(self._record_lines))
+                self._record_lines = []
+        if final and self._record_lines:
+            records.append("\n".join(self._record_lines))
+            self._record_lines = []
+        self._consume(records)
+
+    def _consume(self, records: List[str]) -> None:
+        reader = csv.reader(records, delimiter=self.delimiter, quotechar=self.quotechar)
+        for row in reader:
+            if self.headers is None:
+                if row:
+                    self.headers = row
+            elif any(field.strip() for field in row):
+                self.total_rows += 1
+
+
+class CsvIngestor:
     """
-    アップロードされたCSVファイルを読み込む。
-    複数の文字コードを試し、最適なもので読み込む。
+    アップロードされたCSVをチャンク単位でディスクに書き出しながら、
+    同じパスで文字コード・区切り文字の判定、ヘッダーの取得、行数のカウントを行う。
+    ファイル全体をメモリに載せることはない。
+    write が False の場合は書き出さず、dest_path にすでにあるファイルの内容を feed で受け取って判定だけを行う。
     """
-    # 試行する文字コードのリスト
-    encodings_to_try = ['utf-8', 'utf-8-sig', 'cp932', 'shift_jis']
-    df = None
 
-    for encoding in encodings_to_try:
+    def __init__(self, dest_path: Path, write: bool = True):
+        self.dest_path = dest_path
+        self.size_bytes = 0
+        self.encoding: Optional[str] = None
+        self.dialect: Optional[Dict[str, str]] = None
+        self._file = open(dest_path, "wb") if write else None
+        self._sample = bytearray()
+        self._decoder = None
+        self._counter: Optional[_RecordCounter] = None
+        # 先頭サンプルでは判定できなかった文字がサンプル以降にあった場合に立てる
+        self._needs_rescan = False
+
+    def feed(self, chunk: bytes) -> None:
+        if self._file is not None:
+            self._file.write(chunk)
+        self.size_bytes += len(chunk)
+        if self._counter is None:
+            self._sample.extend(chunk)
+            if len(self._sample) >= SAMPLE_SIZE:
+                self._start(bytes(self._sample))
+                self._sample = bytearray()
+        else:
+            self._decode_and_count(chunk)
+
+    def _start(self, sample: bytes, final: bool = False) -> None:
+        self.encoding = detect_encoding(sample)
+        if self.encoding is None:
+            raise ValueError("サポートされている文字コード（UTF-8, CP932, Shift_JIS）でファイルを読み込めませんでした。")
+        self._decoder = codecs.getincrementaldecoder(self.encoding)()
+        sample_text = self._decoder.decode(sample, final=final)
+        self.dialect = sniff_dialect(sample_text)
+        self._counter = _RecordCounter(**self.dialect)
+        self._counter.feed(sample_text, final=final)
+
+    def _decode_and_count(self, chunk: bytes, final: bool = False) -> None:
+        if self._needs_rescan:
+            return
+        try:
+            self._counter.feed(self._decoder.decode(chunk, final=final), final=final)
+        except UnicodeDecodeError:
+            self._needs_rescan = True
+
+    def finish(self) -> Dict[str, Any]:
+        """書き込みを完了し、ファイル情報（文字コード・区切り文字・ヘッダー・行数）を返す。"""
+        if self._file is not None:
+            self._file.close()
+        if self._counter is None:
+            self._start(bytes(self._sample), final=True)
+        else:
+            self._decode_and_count(b"", final=True)
+        if self._needs_rescan:
+            self._rescan()
+        print(f"Ingested upload ({self.size_bytes} bytes) with encoding: '{self.encoding}'")
+        return {
+            "encoding": self.encoding,
+            "delimiter": self.dialect["delimiter"],
+            "quotechar": self.dialect["quotechar"],
+            "headers": self._counter.headers or [],
+            "total_rows": self._counter.total_rows,
+            "size_bytes": self.size_bytes,
+        }
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self.dest_path.unlink(missing_ok=True)
+
+    def _rescan(self) -> None:
+        """判定した文字コードで途中から読めなくなった場合、残りの候補でディスク上のファイルを読み直す。"""
+        remaining = ENCODINGS_TO_TRY[ENCODINGS_TO_TRY.index(self.encoding) + 1:]
+        for encoding in remaining:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            counter = _RecordCounter(**self.dialect)
+            try:
+                with open(self.dest_path, "rb") as f:
+                    while chunk := f.read(READ_CHUNK_SIZE):
+                        counter.feed(decoder.decode(chunk))
+                counter.feed(decoder.decode(b"", final=True), final=True)
+            except UnicodeDecodeError:
+                continue
+            print(f"Encoding '{self.encoding}' failed past the sample; fell back to '{encoding}'")
+            self.encoding, self._counter = encoding, counter
+            return
+        raise ValueError("サポートされている文字コード（UTF-8, CP932, Shift_JIS）でファイルを読み込めませんでした。")
+
+
+def inspect_csv(file_path: Path) -> Dict[str, Any]:
+    """ディスク上のCSVをチャンク単位で読み、ファイル情報（文字コード・区切り文字・ヘッダー・行数）を返す。"""
+    ingestor = CsvIngestor(file_path, write=False)
+    with open(file_path, "rb") as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            ingestor.feed(chunk)
+    return ingestor.finish()
+
+
+def file_info_path(file_path: Path) -> Path:
+    return file_path.with_suffix(".json")
+
+
+def save_file_info(file_path: Path, info: Dict[str, Any]) -> None:
+    """アップロード時に判定したファイル情報を、CSVと同じ場所に保存する。"""
+    file_info_path(file_path).write_text(json.dumps(info, ensure_ascii=False), encoding="utf-8")
+
+
+def load_file_info(file_path: Path) -> Optional[Dict[str, Any]]:
+    path = file_info_path(file_path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def preprocess_csv(file: IO[bytes], column_name: Union[str, Sequence[str]], file_info: Optional[Dict[str, Any]] = None,
+                   extra_columns: Sequence[str] = ()) -> pd.DataFrame:
+    """
+    アップロードされたCSVファイルから、指定された列（と extra_columns）だけを読み込む。
+    column_name に列名のリストを渡すと、複数の自由記述列を1回の読み込みで取り出す。
+    file_info（アップロード時に判定した文字コード・区切り文字）があればそれを使って一度だけ読み込み、
+    無ければ複数の文字コードを試す。
+    """
+    text_columns = [column_name] if isinstance(column_name, str) else list(column_name)
+    columns = list(dict.fromkeys([*text_columns, *extra_columns]))
+    if file_info is not None:
+        for column in columns:
+            if column not in file_info.get("headers", []):
+                raise ValueError(f"指定された列'{column}'がCSVに見つかりません。")
+        df = pd.read_csv(
+            file, encoding=file_info["encoding"], sep=file_info["delimiter"], quotechar=file_info["quotechar"],
+            usecols=columns, dtype=str,
+        )
+    else:
+        df = _read_csv_trying_encodings(file, columns)
+
+    # --- 以下は、ファイル読み込み成功後の共通処理 ---
+    # コメントが空の行を削除（複数の列を読み込んだ場合は、すべての列が空の行）
+    # 列ごとに作る（空のデータフレームに apply すると真偽値ではなく元の値が返る）
+    filled = pd.DataFrame(
+        {column: df[column].fillna("").str.strip() != "" for column in text_columns}, index=df.index,
+    )
+    df = df[filled.any(axis=1)]
+
+    for text_column in text_columns:
+        print(f"CSVファイルを読み込み、'{text_column}'列から{int(filled.loc[df.index, text_column].sum())}件のコメントを前処理しました。")
+    return df
+
+
+def _read_csv_trying_encodings(file: IO[bytes], columns: List[str]) -> pd.DataFrame:
+    """ファイル情報が無い場合のフォールバック。複数の文字コードを試し、最適なもので読み込む。"""
+    for encoding in ENCODINGS_TO_TRY:
         try:
             # ファイルの読み取り位置を毎回先頭に戻すことが重要
             file.seek(0)
-            
-            # 指定した文字コードで読み込みを試行
-            df = pd.read_csv(file, encoding=encoding)
-            
+
+            # 指定した文字コードで読み込みを試行（対象の列だけを読み込む）
+            df = pd.read_csv(file, encoding=encoding, usecols=lambda c: c in columns, dtype=str)
+
             # 成功したら、どの文字コードで成功したかターミナルに表示
             print(f"Successfully read CSV with encoding: '{encoding}'")
             break  # 読み込みに成功したらループを抜ける
@@ -28,18 +259,11 @@ def preprocess_csv(file: IO[bytes], column_name: str) -> pd.DataFrame:
             # 読み込みに失敗した場合は、次の文字コードを試す
             print(f"Failed to read with encoding: '{encoding}'. Trying next...")
             continue
-    
-    # すべての文字コードで読み込みに失敗した場合
-    if df is None:
+    else:
+        # すべての文字コードで読み込みに失敗した場合
         raise ValueError("サポートされている文字コード（UTF-8, CP932, Shift_JIS）でファイルを読み込めませんでした。ファイルの形式を確認してください。")
 
-    # --- 以下は、ファイル読み込み成功後の共通処理 ---
-    if column_name not in df.columns:
-        raise ValueError(f"指定された列'{column_name}'がCSVに見つかりません。")
-    
-    # コメントが空の行を削除
-    df.dropna(subset=[column_name], inplace=True)
-    df = df[df[column_name].str.strip() != '']
-    
-    print(f"CSVファイルを読み込み、'{column_name}'列から{len(df)}件のコメントを前処理しました。")
-    return df
\ No newline at end of file
+    for column in columns:
+        if column not in df.columns:
+            raise ValueError(f"指定された列'{column}'がCSVに見つかりません。")
+    return df
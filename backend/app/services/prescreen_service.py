@@ -0,0 +1,105 @@
+# backend/app/services/prescreen_service.py
+
+import unicodedata
+from typing import Any, Dict, Optional, Tuple
+
+# 「特になし」のような内容の無い回答（記号・空白を除き、英字は小文字にしてから比較する）
+NO_CONTENT_ANSWERS = {
+    "なし", "無し", "ナシ", "ない", "無い", "ありません", "ないです", "なしです", "特になし", "特に無し", "とくになし",
+    "特にない", "特に無い", "とくにない", "特にないです", "特になしです", "特にありません", "とくにありません",
+    "特になかった", "特にございません", "何もない", "なにもない", "何もありません", "以上",
+    "none", "no", "nothing", "n/a", "na",
+}
+
+POSITIVE_EMOJI = set("😊😀😃😄😁🙂😆😍🥰🤩👍👏🙏✨🎉💯❤♥⭐🌟")
+NEGATIVE_EMOJI = set("😢😭😞😔😩😫😡😠🤬👎💢😰😱🤮")
+# 絵文字の見た目を変えるだけの文字（異体字セレクタ・ゼロ幅接合子・肌の色）
+EMOJI_MODIFIERS = {"\ufe0f", "\u200d"} | {chr(c) for c in range(0x1F3FB, 0x1F400)}
+
+# 短い称賛と判定する語と、そのカテゴリ
+PRAISE_TERMS = {
+    "分かりやすかった": "講義内容", "わかりやすかった": "講義内容", "分かりやすい": "講義内容", "わかりやすい": "講義内容",
+    "面白かった": "講義内容", "おもしろかった": "講義内容", "楽しかった": "講義内容",
+    "勉強になった": "講義内容", "ためになった": "講義内容", "為になった": "講義内容",
+    "良い授業": "講義内容", "いい授業": "講義内容", "見やすかった": "講義資料",
+    "勉強になりました": "講義内容", "ためになりました": "講義内容",
+    "良かった": "その他", "よかった": "その他", "ありがとう": "その他", "満足": "その他", "最高": "その他",
+}
+# 称賛の語の前後に付けてよい語。短い称賛は「強調 + 称賛の語 + 丁寧な語尾」だけからなる回答に限る
+# （「満足できず」「良かったのは最初だけ」のように、称賛の語を含むだけの回答は対象外）
+PRAISE_INTENSIFIERS = ("", "とても", "すごく", "大変", "本当に", "非常に")
+PRAISE_ENDINGS = ("", "です", "でした", "ました", "ございます", "ございました")
+PRAISE_PHRASES = {
+    intensifier + term + ending: (term, category)
+    for term, category in PRAISE_TERMS.items()
+    for intensifier in PRAISE_INTENSIFIERS
+    for ending in PRAISE_ENDINGS
+}
+# 否定・逆接・限定・要望・不満を表す語。称賛の語以外の部分（「？」など）に含まれていれば称賛とはみなさない
+CAUTION_TERMS = (
+    "ない", "なかっ", "なく", "ません", "ず", "けど", "けれど", "しかし", "でも", "ただ", "が", "のに", "だけ",
+    "もっと", "欲し", "ほし", "難し", "改善", "要望", "残念", "不満", "微妙", "悪", "遅", "すぎ", "少な", "にく",
+    "つまら", "?",
+)
+
+# 規則ごとの確信度
+NO_CONTENT_CONFIDENCE = 0.98
+EMOJI_CONFIDENCE = 0.9
+UNKNOWN_EMOJI_CONFIDENCE = 0.6
+# 短い称賛は、長くなるほど条件や補足が含まれやすいので確信度を下げる
+PRAISE_BASE_CONFIDENCE = 0.95
+PRAISE_CONFIDENCE_PER_CHAR = 0.01
+
+
+def _core(normalized: str) -> str:
+    """正規化済みの本文から空白・句読点・長音などの記号を除き、英字を小文字にする。"""
+    return "".join(
+        ch for ch in normalized
+        if not unicodedata.category(ch).startswith(("P", "Z", "C")) and ch not in "ー~〜…"
+    ).lower()
+
+
+def _is_emoji(ch: str) -> bool:
+    return unicodedata.category(ch) == "So" or ch in EMOJI_MODIFIERS
+
+
+def _local_result(sentiment: str, category: str, score: int, summary: str) -> Dict[str, Any]:
+    return {
+        "sentiment": sentiment, "category": category, "score": score, "summary": summary,
+        "is_critical": False, "source": "local",
+    }
+
+
+def classify(text: str, max_chars: int) -> Optional[Tuple[Dict[str, Any], float]]:
+    """
+    LLMに送るまでもないコメントを、辞書と規則でローカルに分類する。
+    (分析結果, 確信度) を返し、どの規則にも当てはまらなければ None を返す。
+    max_chars を超える長さのコメントは短い称賛とはみなさない。
+    """
+    normalized = unicodedata.normalize("NFKC", text).strip()
+    core = _core(normalized)
+    # 「-」「特になし」など、内容の無い回答
+    if not core or core in NO_CONTENT_ANSWERS:
+        return _local_result("neutral", "その他", 1, "特になし"), NO_CONTENT_CONFIDENCE
+
+    # 絵文字だけの回答
+    if all(_is_emoji(ch) for ch in core):
+        positive = any(ch in POSITIVE_EMOJI for ch in core)
+        negative = any(ch in NEGATIVE_EMOJI for ch in core)
+        if positive and not negative:
+            return _local_result("positive", "その他", 1, "絵文字のみの好意的な回答"), EMOJI_CONFIDENCE
+        if negative and not positive:
+            return _local_result("negative", "その他", 1, "絵文字のみの否定的な回答"), EMOJI_CONFIDENCE
+        return _local_result("neutral", "その他", 1, "絵文字のみの回答"), UNKNOWN_EMOJI_CONFIDENCE
+
+    # 称賛の語と丁寧な語尾だけからなる、否定や要望を含まない短い称賛
+    phrase = PRAISE_PHRASES.get(core)
+    if phrase is None or len(core) > max_chars:
+        return None
+    praise_term, category = phrase
+    # 「ありがとう」の「が」のように、称賛の語そのものに含まれる文字は否定・逆接とみなさない
+    rest = normalized.lower().replace(praise_term, "", 1)
+    if not any(term in rest for term in CAUTION_TERMS):
+        confidence = PRAISE_BASE_CONFIDENCE - PRAISE_CONFIDENCE_PER_CHAR * len(core)
+        return _local_result("positive", category, 2, normalized[:20]), confidence
+    return None
@@ -0,0 +1,38 @@
+# backend/app/services/report_service.py
+
+from typing import Any, Dict, Iterator, Optional
+from app.core.config import settings
+from . import llm_service
+from .cache_service import report_cache
+
+
+def _cache_key(dashboard_data: Dict[str, Any]) -> str:
+    return report_cache.key_for(llm_service.report_prompt_fields(dashboard_data))
+
+
+def get_cached_report(dashboard_data: Dict[str, Any]) -> Optional[str]:
+    """同じ件数・テーマ名で生成済みのレポートがあれば返す。"""
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    return report_cache.get(_cache_key(dashboard_data))
+
+
+def stream_report(dashboard_data: Dict[str, Any]) -> Iterator[str]:
+    """
+    レポートを生成しながら断片ごとに返し、最後まで生成できたらキャッシュに保存する。
+    途中で失敗した・打ち切られたレポートは保存しない。
+    """
+    parts = []
+    for part in llm_service.stream_narrative_report(dashboard_data):
+        parts.append(part)
+        yield part
+    if settings.LLM_CACHE_ENABLED:
+        report_cache.put(_cache_key(dashboard_data), "".join(parts))
+
+
+def generate_report(dashboard_data: Dict[str, Any]) -> str:
+    """キャッシュ済みのレポートがあればそれを、無ければ生成して返す。"""
+    cached = get_cached_report(dashboard_data)
+    if cached is not None:
+        return cached
+    return "".join(stream_report(dashboard_data))
@@ -0,0 +1,292 @@
+# backend/app/services/results_service.py
+
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+
+# 1回の INSERT でまとめて書き込む行数
+WRITE_BATCH_SIZE = 5000
+
+# 問い合わせで使える並び順
+ORDER_BY = {
+    "row": "row_index ASC",
+    "score": "score DESC, row_index ASC",
+}
+
+
+class StoredRow(NamedTuple):
+    """差分検出に使う、保存済みの1行の情報"""
+    content_hash: str
+    row_index: int
+    original_text: str
+    sentiment: Optional[str]
+    category: Optional[str]
+    is_critical: bool
+
+
+class ResultWriter:
+    """1回の分析のコメント単位の結果を、一定件数ごとにまとめて書き込む。"""
+
+    def __init__(self, store: "ResultStore", result_id: str):
+        self._store = store
+        self._result_id = result_id
+        self._pending: List[Tuple] = []
+
+    def add(self, row_key: str, content_hash: str, row_index: int, text: str, result: Dict[str, Any]) -> None:
+        self._pending.append((
+            self._result_id, row_key, content_hash, row_index, text, result.get("sentiment"), result.get("category"),
+            result.get("score"), result.get("summary"), 1 if result.get("is_critical") else 0,
+            result.get("source", "llm"),
+        ))
+        if len(self._pending) >= WRITE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self._store._insert(self._pending)
+            self._pending = []
+
+
+class ResultStore:
+    """
+    分析結果をコメント単位で保存し、感情・カテゴリ・要対応フラグ・スコアで絞り込んで
+    ページ単位で取り出せるようにするローカルのストア（SQLite）。
+    ダッシュボードには集計値と上位の数件だけを載せ、個々のコメントはここから問い合わせる。
+    各行は行キー（キー列の値、または本文のハッシュ）で識別され、差分分析で既存の結果を更新できる。
+    """
+
+    def __init__(self, path: str, retention_seconds: int):
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        self._result_locks: Dict[str, threading.Lock] = {}
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(comment_result)")}
+            if columns and "row_key" not in columns:
+                # 行キーを持たない古い形式の結果は差分分析に使えないので作り直す
+                self._conn.execute("DROP TABLE comment_result")
+                self._conn.execute("DROP TABLE IF EXISTS analysis_run")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS analysis_run (
+                    result_id TEXT PRIMARY KEY,
+                    row_key_column TEXT,
+                    dashboard TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS comment_result (
+                    result_id TEXT NOT NULL,
+                    row_key TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    row_index INTEGER NOT NULL,
+                    original_text TEXT NOT NULL,
+                    sentiment TEXT,
+                    category TEXT,
+                    score INTEGER,
+                    summary TEXT,
+                    is_critical INTEGER NOT NULL,
+                    source TEXT NOT NULL DEFAULT 'llm',
+                    PRIMARY KEY (result_id, row_key)
+                )"""
+            )
+            if columns and "source" not in columns and "row_key" in columns:
+                # 判定元（LLM / ローカル）を持たない結果は、すべてLLMの結果
+                self._conn.execute("ALTER TABLE comment_result ADD COLUMN source TEXT NOT NULL DEFAULT 'llm'")
+            for column in ("row_index", "sentiment", "category", "is_critical", "score"):
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_comment_result_{column} ON comment_result (result_id, {column})"
+                )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS theme_state (
+                    result_id TEXT NOT NULL,
+                    polarity TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    centers BLOB NOT NULL,
+                    idf BLOB NOT NULL,
+                    PRIMARY KEY (result_id, polarity)
+                )"""
+            )
+
+    def result_lock(self, result_id: str) -> threading.Lock:
+        """同じ分析結果を複数のジョブが同時に更新しないためのロック"""
+        with self._lock:
+            return self._result_locks.setdefault(result_id, threading.Lock())
+
+    def writer(self, result_id: str, row_key_column: Optional[str] = None, replace: bool = True) -> ResultWriter:
+        """
+        分析結果の書き込みを始める。replace が True の場合、同じ result_id の古い結果は置き換えられる。
+        False の場合は既存の結果に対して行キー単位で追加・上書きする。
+        """
+        self._prune()
+        now = time.time()
+        with self._lock, self._conn:
+            if replace:
+                self._delete(result_id)
+                self._conn.execute(
+                    "INSERT INTO analysis_run (result_id, row_key_column, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (result_id, row_key_column, now, now),
+                )
+            else:
+                self._conn.execute("UPDATE analysis_run SET updated_at = ? WHERE result_id = ?", (now, result_id))
+        return ResultWriter(self, result_id)
+
+    def _insert(self, rows: Iterable[Tuple]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO comment_result "
+                "(result_id, row_key, content_hash, row_index, original_text, sentiment, category, score, summary, is_critical, source) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def delete_rows(self, result_id: str, row_keys: Iterable[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM comment_result WHERE result_id = ? AND row_key = ?",
+                ((result_id, key) for key in row_keys),
+            )
+
+    def move_rows(self, result_id: str, moves: Iterable[Tuple[str, int]]) -> None:
+        """(行キー, 新しい行番号) の組で、内容の変わっていない行の位置だけを更新する。"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE comment_result SET row_index = ? WHERE result_id = ? AND row_key = ?",
+                ((row_index, result_id, key) for key, row_index in moves),
+            )
+
+    def exists(self, result_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM analysis_run WHERE result_id = ?", (result_id,)).fetchone()
+        return row is not None
+
+    def run_info(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """分析結果の行キー列と、最後に保存したダッシュボードを返す。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row_key_column, dashboard FROM analysis_run WHERE result_id = ?", (result_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"row_key_column": row[0], "dashboard": json.loads(row[1]) if row[1] else None}
+
+    def save_dashboard(self, result_id: str, dashboard: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE analysis_run SET dashboard = ? WHERE result_id = ?",
+                (json.dumps(dashboard, ensure_ascii=False), result_id),
+            )
+
+    def row_states(self, result_id: str) -> Dict[str, StoredRow]:
+        """差分検出用に、保存済みの全行を行キーごとに返す。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row_key, content_hash, row_index, original_text, sentiment, category, is_critical "
+                "FROM comment_result WHERE result_id = ?",
+                (result_id,),
+            ).fetchall()
+        return {
+            key: StoredRow(content_hash, row_index, text, sentiment, category, bool(critical))
+            for key, content_hash, row_index, text, sentiment, category, critical in rows
+        }
+
+    def text_counts(self, result_id: str, sentiment: str) -> Counter:
+        """指定した感情のコメントの「本文 → 件数」を返す（テーマの再クラスタリング用）。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT original_text, COUNT(*) FROM comment_result WHERE result_id = ? AND sentiment = ? "
+                "GROUP BY original_text",
+                (result_id, sentiment),
+            ).fetchall()
+        return Counter(dict(rows))
+
+    def save_theme_state(self, result_id: str, polarity: str, state: Dict[str, Any],
+                         centers: bytes, idf: bytes) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO theme_state (result_id, polarity, state, centers, idf) VALUES (?, ?, ?, ?, ?)",
+                (result_id, polarity, json.dumps(state, ensure_ascii=False), centers, idf),
+            )
+
+    def load_theme_state(self, result_id: str, polarity: str) -> Optional[Tuple[Dict[str, Any], bytes, bytes]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, centers, idf FROM theme_state WHERE result_id = ? AND polarity = ?",
+                (result_id, polarity),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def delete_theme_state(self, result_id: str, polarity: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM theme_state WHERE result_id = ? AND polarity = ?", (result_id, polarity))
+
+    def query(self, result_id: str, sentiment: Optional[str] = None, category: Optional[str] = None,
+              is_critical: Optional[bool] = None, source: Optional[str] = None, min_score: Optional[int] = None, max_score: Optional[int] = None,
+              order_by: str = "row", page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+        """条件に合うコメントの件数と、指定したページの結果を返す。"""
+        conditions, params = ["result_id = ?"], [result_id]
+        if sentiment is not None:
+            conditions.append("sentiment = ?")
+            params.append(sentiment)
+        if category is not None:
+            conditions.append("category = ?")
+            params.append(category)
+        if is_critical is not None:
+            conditions.append("is_critical = ?")
+            params.append(1 if is_critical else 0)
+        if source is not None:
+            conditions.append("source = ?")
+            params.append(source)
+        if min_score is not None:
+            conditions.append("score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            conditions.append("score <= ?")
+            params.append(max_score)
+        where = " AND ".join(conditions)
+        with self._lock:
+            (total,) = self._conn.execute(f"SELECT COUNT(*) FROM comment_result WHERE {where}", params).fetchone()
+            rows = self._conn.execute(
+                f"SELECT row_index, original_text, sentiment, category, score, summary, is_critical, source "
+                f"FROM comment_result WHERE {where} ORDER BY {ORDER_BY[order_by]} LIMIT ? OFFSET ?",
+                (*params, page_size, (page - 1) * page_size),
+            ).fetchall()
+        items = [
+            {
+                "id": row_index, "original_text": text, "sentiment": sentiment, "category": category,
+                "score": score, "summary": summary, "is_critical": bool(critical), "source": source,
+            }
+            for row_index, text, sentiment, category, score, summary, critical, source in rows
+        ]
+        return {"total": total, "page": page, "page_size": page_size, "items": items}
+
+    def delete(self, result_id: str) -> None:
+        with self._lock, self._conn:
+            self._delete(result_id)
+
+    def _delete(self, result_id: str) -> None:
+        for table in ("comment_result", "theme_state", "analysis_run"):
+            self._conn.execute(f"DELETE FROM {table} WHERE result_id = ?", (result_id,))
+
+    def _prune(self) -> None:
+        """最後の更新から保持期間を過ぎた分析結果を削除する。"""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock, self._conn:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT result_id FROM analysis_run WHERE updated_at < ?", (cutoff,)
+            ).fetchall()]
+            for result_id in expired:
+                self._delete(result_id)
+
+
+result_store = ResultStore(settings.RESULT_STORE_PATH, settings.RESULT_RETENTION_SECONDS)
@@ -0,0 +1,111 @@
+# backend/app/services/theme_service.py
+
+from collections import Counter
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.core import metrics
+from . import clustering_service, llm_service
+from .results_service import result_store
+
+
+class ThemeState:
+    """
+    ある感情（positive / negative）のコメントのテーマと、新しいコメントを既存のテーマに割り当てるための重心。
+    poor_fits は最後にクラスタリングしてから加わったコメントのうち、どのテーマにもよく当てはまらなかった件数。
+    """
+
+    def __init__(self, themes: List[Dict[str, Any]], centers: np.ndarray, idf: np.ndarray,
+                 similarity_floor: float, poor_fits: int = 0):
+        self.themes = themes
+        self.centers = centers
+        self.idf = idf
+        self.similarity_floor = similarity_floor
+        self.poor_fits = poor_fits
+
+    def total(self) -> int:
+        return sum(theme["count"] for theme in self.themes)
+
+    def drift(self) -> float:
+        total = self.total()
+        return self.poor_fits / total if total else 0.0
+
+    def to_dashboard(self) -> List[Dict[str, Any]]:
+        """件数の多い順に並べたテーマ（件数が0になったものは除く）"""
+        return sorted((theme for theme in self.themes if theme["count"] > 0), key=lambda t: t["count"], reverse=True)
+
+
+def build_themes(comment_counts: Mapping[str, int], num_clusters: int, tenant: str) -> Optional[ThemeState]:
+    """すべてのコメントをクラスタリングし、LLMでテーマ名を付ける。コメントが無ければ None を返す。"""
+    with metrics.span("clustering"):
+        model = clustering_service.fit_clusters(comment_counts, num_clusters)
+    if model is None:
+        return None
+    themes = llm_service.summarize_clusters(model.clusters, tenant, name_with_llm=len(comment_counts) > num_clusters)
+    return ThemeState(themes, model.centers, model.idf, model.similarity_floor)
+
+
+def update_themes(state: ThemeState, added: Mapping[str, int], removed: Mapping[str, int]) -> None:
+    """追加・削除されたコメントを、クラスタリングし直さずに最も近い既存のテーマの件数に反映する。"""
+    added_texts = list(added)
+    labels, similarities = clustering_service.assign_to_clusters(state.centers, state.idf, added_texts)
+    for text, label, similarity in zip(added_texts, labels, similarities):
+        state.themes[label]["count"] += added[text]
+        if similarity < state.similarity_floor:
+            state.poor_fits += added[text]
+    removed_texts = list(removed)
+    labels, _ = clustering_service.assign_to_clusters(state.centers, state.idf, removed_texts)
+    for text, label in zip(removed_texts, labels):
+        state.themes[label]["count"] = max(0, state.themes[label]["count"] - removed[text])
+
+
+def save_themes(result_id: str, polarity: str, state: Optional[ThemeState]) -> None:
+    if state is None:
+        result_store.delete_theme_state(result_id, polarity)
+        return
+    result_store.save_theme_state(
+        result_id, polarity,
+        {"themes": state.themes, "similarityFloor": state.similarity_floor, "poorFits": state.poor_fits},
+        state.centers.astype(np.float32).tobytes(), state.idf.astype(np.float32).tobytes(),
+    )
+
+
+def load_themes(result_id: str, polarity: str) -> Optional[ThemeState]:
+    stored = result_store.load_theme_state(result_id, polarity)
+    if stored is None:
+        return None
+    state, centers, idf = stored
+    return ThemeState(
+        state["themes"],
+        np.frombuffer(centers, dtype=np.float32).reshape(len(state["themes"]), -1),
+        np.frombuffer(idf, dtype=np.float32),
+        state["similarityFloor"],
+        state["poorFits"],
+    )
+
+
+def refresh_themes(result_id: str, polarity: str, num_clusters: int, added: Counter, tenant: str,
+                   removed: Optional[Counter] = None, incremental: bool = False) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    テーマを更新して保存し、(ダッシュボード用のテーマ, クラスタリングし直したか) を返す。
+    テーマ名を付けるLLM呼び出しは共有スケジューラの tenant のキューに入る。
+    差分分析では新しいコメントを既存のテーマに割り当て、当てはまりの悪いコメントの割合（ドリフト）が
+    THEME_DRIFT_THRESHOLD を超えた場合だけ、保存済みの全コメントでクラスタリングし直す。
+    """
+    if not incremental:
+        state = build_themes(added, num_clusters, tenant)
+        save_themes(result_id, polarity, state)
+        return (state.to_dashboard() if state else []), True
+
+    state = load_themes(result_id, polarity)
+    if state is not None:
+        update_themes(state, added, removed or Counter())
+        if state.drift() <= settings.THEME_DRIFT_THRESHOLD:
+            save_themes(result_id, polarity, state)
+            return state.to_dashboard(), False
+        print(f"Theme drift for {polarity} comments is {state.drift():.2f}; re-clustering.")
+    elif not added:
+        return [], False
+    state = build_themes(result_store.text_counts(result_id, polarity), num_clusters, tenant)
+    save_themes(result_id, polarity, state)
+    return (state.to_dashboard() if state else []), True
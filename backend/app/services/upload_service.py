@@ -0,0 +1,226 @@
+# backend/app/services/upload_service.py
+
+import hashlib
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, Optional, Tuple
+from app.core.config import settings
+from . import checkpoint_service, preprocessing_service
+
+# アップロードを読み込む際のチャンクサイズ
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 書き込み途中のファイルの拡張子
+PARTIAL_SUFFIX = ".part"
+# ストアが管理するファイルの拡張子（索引のデータベースは含まない）
+MANAGED_SUFFIXES = (".csv", ".json", PARTIAL_SUFFIX)
+
+
+class UploadStore:
+    """
+    アップロードされたCSVを内容のハッシュで管理するストア。
+    同じ内容のファイルが再度アップロードされた場合は解析結果を捨てて、既存の file_id とファイル情報を返す。
+    ファイル名は内容に紐づくファイル情報（.json）には含めず索引に持ち、最後にアップロードされたときの名前にする。
+    最後に使われてから ttl_seconds を過ぎたファイルと、合計サイズが quota_bytes を超えた分の使われていない順の
+    ファイルは、バックグラウンドの掃除で（チェックポイントごと）削除される。分析中のファイルは削除しない。
+    """
+
+    def __init__(self, directory: str, ttl_seconds: int, quota_bytes: int, sweep_interval_seconds: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.quota_bytes = quota_bytes
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._lock = threading.Lock()
+        # 分析中のファイルの参照数
+        self._leases: Counter = Counter()
+        self._conn = sqlite3.connect(self.directory / "uploads.sqlite3", check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS upload (
+                    file_id TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL UNIQUE,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    filename TEXT NOT NULL DEFAULT ''
+                )"""
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(upload)")}
+            if "filename" not in columns:
+                # ファイル名を索引に持たない古い形式（ファイル情報の filename をそのまま使う）
+                self._conn.execute("ALTER TABLE upload ADD COLUMN filename TEXT NOT NULL DEFAULT ''")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_upload_last_used_at ON upload (last_used_at)")
+        threading.Thread(target=self._sweep_periodically, name="upload-sweeper", daemon=True).start()
+
+    def path_for(self, file_id: str) -> Path:
+        return self.directory / f"{file_id}.csv"
+
+    def store(self, stream: IO[bytes], filename: str) -> Tuple[str, Dict[str, Any], bool]:
+        """
+        ストリームの内容をハッシュを計算しながらディスクに書き出し、(file_id, ファイル情報, 既存のファイルか) を返す。
+        同じ内容のファイルがすでにあれば、書き出したものを捨てて解析せずにそれを返す（ファイル名は今回の名前にする）。
+        無い場合だけ書き出したファイルをCSVとして解析して登録する。
+        読み込めなかった場合は書き出したファイルを削除して例外を送出する。
+        """
+        partial = self.directory / f"{uuid.uuid4()}{PARTIAL_SUFFIX}"
+        digest = hashlib.sha256()
+        size_bytes = 0
+        try:
+            with open(partial, "wb") as f:
+                while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+                    size_bytes += len(chunk)
+                    # 上限を超えた時点で打ち切り、ディスクを使い切らないようにする
+                    if size_bytes > self.quota_bytes:
+                        raise ValueError("ファイルが大きすぎます。")
+                    digest.update(chunk)
+                    f.write(chunk)
+            content_hash = digest.hexdigest()
+            existing = self._find(content_hash, filename)
+            if existing is not None:
+                partial.unlink(missing_ok=True)
+                print(f"Upload matches existing file {existing[0]}; reusing it.")
+                return existing[0], existing[1], True
+            file_info = preprocessing_service.inspect_csv(partial)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+
+        file_id = str(uuid.uuid4())
+        file_path = self.path_for(file_id)
+        partial.rename(file_path)
+        preprocessing_service.save_file_info(file_path, file_info)
+
+        now = time.time()
+        with self._lock, self._conn:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO upload (file_id, content_hash, size_bytes, created_at, last_used_at, filename) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, content_hash, size_bytes, now, now, filename),
+            ).rowcount
+        if not inserted:
+            # 同じ内容のアップロードが同時に処理され、先に登録された
+            self._remove_files(file_id)
+            existing = self._find(content_hash, filename)
+            if existing is not None:
+                return existing[0], existing[1], True
+            raise ValueError("アップロードの保存に失敗しました。再度アップロードしてください。")
+        self.sweep()
+        return file_id, {**file_info, "filename": filename}, False
+
+    def _find(self, content_hash: str, filename: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """同じ内容のファイルを探し、あればファイル名を今回の名前に更新して (file_id, ファイル情報) を返す。"""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT file_id FROM upload WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE upload SET filename = ? WHERE file_id = ?", (filename, row[0]))
+        if row is None:
+            return None
+        file_info = self.get(row[0])
+        return (row[0], file_info) if file_info is not None else None
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """ファイル情報（ファイル名を含む）を返し、最終利用時刻を更新する。ファイルが無ければ None を返す。"""
+        file_path = self.path_for(file_id)
+        with self._lock:
+            row = self._conn.execute("SELECT filename FROM upload WHERE file_id = ?", (file_id,)).fetchone()
+        file_info = preprocessing_service.load_file_info(file_path) if row is not None and file_path.exists() else None
+        if file_info is None:
+            if row is not None:
+                # ディスクから消えたファイルは索引からも外す
+                self.delete(file_id)
+            return None
+        self._touch(file_id)
+        if row[0]:
+            file_info["filename"] = row[0]
+        return file_info
+
+    def _touch(self, file_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE upload SET last_used_at = ? WHERE file_id = ?", (time.time(), file_id))
+
+    @contextmanager
+    def lease(self, file_id: str) -> Iterator[Path]:
+        """分析中のファイルが掃除で削除されないよう確保し、そのパスを返す。"""
+        with self._lock:
+            self._leases[file_id] += 1
+        try:
+            # 確保してから存在を確かめれば、その間に掃除で消されることはない
+            if self.get(file_id) is None:
+                raise ValueError("アップロードされたファイルが見つかりません。再度アップロードしてください。")
+            yield self.path_for(file_id)
+        finally:
+            with self._lock:
+                self._leases[file_id] -= 1
+                if self._leases[file_id] <= 0:
+                    del self._leases[file_id]
+            self._touch(file_id)
+
+    def delete(self, file_id: str) -> bool:
+        """ファイルとそのファイル情報・チェックポイントを削除する。登録されていなければ False を返す。"""
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM upload WHERE file_id = ?", (file_id,)).rowcount
+        self._remove_files(file_id)
+        return bool(deleted)
+
+    def _remove_files(self, file_id: str) -> None:
+        file_path = self.path_for(file_id)
+        file_path.unlink(missing_ok=True)
+        preprocessing_service.file_info_path(file_path).unlink(missing_ok=True)
+        checkpoint_service.discard_all(file_id)
+
+    def sweep(self) -> None:
+        """期限切れのファイルと、容量の上限を超えた分の最も長く使われていないファイルを削除する。"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_id, size_bytes, last_used_at FROM upload ORDER BY last_used_at ASC"
+            ).fetchall()
+            leased = set(self._leases)
+        total_bytes = sum(size for _, size, _ in rows)
+        evicted = []
+        for file_id, size, last_used_at in rows:
+            if file_id in leased:
+                continue
+            if last_used_at < now - self.ttl_seconds or total_bytes > self.quota_bytes:
+                evicted.append(file_id)
+                total_bytes -= size
+        for file_id in evicted:
+            with self._lock, self._conn:
+                # 一覧を取ってから分析に使われ始めたものは残す
+                if file_id in self._leases:
+                    continue
+                self._conn.execute("DELETE FROM upload WHERE file_id = ?", (file_id,))
+            self._remove_files(file_id)
+
+        # 索引に無いファイル（書き込み中に落ちた一時ファイルなど）も、期限を過ぎたら削除する
+        with self._lock:
+            known = {row[0] for row in self._conn.execute("SELECT file_id FROM upload").fetchall()}
+        for path in self.directory.iterdir():
+            if path.suffix not in MANAGED_SUFFIXES or path.stem in known:
+                continue
+            try:
+                if path.stat().st_mtime < now - self.ttl_seconds:
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+        if evicted:
+            print(f"Upload store: evicted {len(evicted)} files ({total_bytes} bytes in use).")
+
+    def _sweep_periodically(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval_seconds)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Upload store sweep failed: {e}")
+
+
+upload_store = UploadStore(
+    settings.UPLOAD_DIR, settings.UPLOAD_TTL_SECONDS, settings.UPLOAD_QUOTA_BYTES, settings.UPLOAD_SWEEP_INTERVAL_SECONDS,
+)
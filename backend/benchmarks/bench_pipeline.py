@@ -0,0 +1,216 @@
+# backend/benchmarks/bench_pipeline.py
+"""
+アップロード → 分析 → レポート生成の一連の流れを、フェイクのLLMバックエンドで計測するベンチマーク。
+APIキーもネットワークも使わないので、パフォーマンスの回帰をオフラインで確認できる。
+
+使い方（backend ディレクトリで実行）:
+    python benchmarks/bench_pipeline.py                       # 1k / 10k / 100k 件で計測
+    python benchmarks/bench_pipeline.py --sizes 1000 --repeat 3
+    python benchmarks/bench_pipeline.py --output result.json   # 結果をJSONで保存
+    python benchmarks/bench_pipeline.py --baseline result.json # 保存した結果と比較し、劣化していれば終了コード1
+
+各サイズは別プロセスで実行するため、ピークRSSはサイズごとの値になる。
+--repeat の各回がキャッシュに当たらないよう、コメント・レポートのキャッシュは無効にし、アップロードも毎回削除する。
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# 合成コメントの材料
+_SUBJECTS = ["授業", "講義", "資料", "スライド", "課題", "小テスト", "板書", "説明", "先生の声", "オンライン配信", "グループワーク", "教科書"]
+_PREDICATES = [
+    "がとても分かりやすかった", "が丁寧で助かりました", "が難しすぎると感じました", "の量が多すぎます",
+    "が聞き取りにくかった", "をもう少しゆっくり進めてほしい", "が面白くて毎回楽しみでした", "の締め切りが厳しい",
+    "がもう少し整理されていると良い", "のおかげで理解が深まりました",
+]
+_TAILS = ["", "。", "！", "です。", "と思います。", "。ありがとうございました。", "。改善をお願いします。"]
+_STOCK_ANSWERS = ["特になし", "特にありません", "なし", "とくになし", "ありません", "-"]
+
+
+def synthetic_comments(count: int, seed: int = 0):
+    """実データに近い重複率になるよう、定型回答と組み合わせ文を混ぜた日本語コメントを生成する。"""
+    rng = random.Random(seed)
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.15:
+            yield rng.choice(_STOCK_ANSWERS)
+        elif roll < 0.85:
+            yield rng.choice(_SUBJECTS) + rng.choice(_PREDICATES) + rng.choice(_TAILS)
+        else:
+            # 長めの自由記述（ほぼ一意）
+            parts = [rng.choice(_SUBJECTS) + rng.choice(_PREDICATES) for _ in range(rng.randint(2, 5))]
+            yield "、".join(parts) + f"（{i}）"
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+def run_single(size: int, repeat: int, batch_size: int) -> dict:
+    """1つのサイズについて計測する（子プロセスで呼ばれる）。"""
+    from fastapi.testclient import TestClient
+    from main import app
+    from app.services import llm_service
+
+    backend = llm_service.backend
+    client = TestClient(app)
+    csv_bytes = ("回答ID,自由記述\n" + "".join(
+        f'{i},"{text}"\n' for i, text in enumerate(synthetic_comments(size))
+    )).encode("utf-8")
+
+    durations, stage_totals = [], {"upload": [], "analyze": [], "report": []}
+    profile = None
+    llm_calls_before = backend.calls
+    processing_stats = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.post("/api/v1/files/upload", files={"file": ("bench.csv", csv_bytes, "text/csv")})
+        response.raise_for_status()
+        file_id = response.json()["file_id"]
+        uploaded = time.perf_counter()
+
+        response = client.post("/api/v1/files/analyze", json={"file_id": file_id, "column_name": "自由記述", "batch_size": batch_size})
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        while True:
+            status = client.get(f"/api/v1/jobs/{job_id}").json()
+            if status["status"] not in ("queued", "running"):
+                break
+            time.sleep(0.05)
+        if status["status"] != "completed":
+            raise RuntimeError(f"analysis job ended with status {status['status']}: {status['error']}")
+        dashboard = client.get(f"/api/v1/jobs/{job_id}/result").json()
+        analyzed = time.perf_counter()
+
+        response = client.post("/api/v1/report/generate", json=dashboard)
+        response.raise_for_status()
+        finished = time.perf_counter()
+
+        durations.append(finished - started)
+        stage_totals["upload"].append(uploaded - started)
+        stage_totals["analyze"].append(analyzed - uploaded)
+        stage_totals["report"].append(finished - analyzed)
+        processing_stats = dashboard.get("processingStats")
+        profile = dashboard.get("profile")
+        # 次の回で同じ内容のアップロードが再利用されないようにする
+        client.delete(f"/api/v1/files/{file_id}").raise_for_status()
+
+    return {
+        "size": size,
+        "repeat": repeat,
+        "throughput_comments_per_sec": size / statistics.median(durations),
+        "end_to_end_p50_sec": _percentile(durations, 50),
+        "end_to_end_p95_sec": _percentile(durations, 95),
+        "stage_median_sec": {stage: statistics.median(values) for stage, values in stage_totals.items()},
+        "llm_calls_per_run": (backend.calls - llm_calls_before) / repeat,
+        "llm_call_p50_sec": _percentile(backend.latencies, 50),
+        "llm_call_p95_sec": _percentile(backend.latencies, 95),
+        # Linux では ru_maxrss は KB 単位
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "processing_stats": processing_stats,
+        "profile": profile,
+    }
+
+
+def _run_in_subprocess(size: int, args) -> dict:
+    """サイズごとにまっさらなプロセス・作業ディレクトリ（キャッシュ・一時ファイル）で計測する。"""
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        env = {
+            **os.environ,
+            "LLM_BACKEND": "fake",
+            "FAKE_LLM_LATENCY_SECONDS": str(args.latency),
+            "FAKE_LLM_ERROR_RATE": str(args.error_rate),
+            "FAKE_LLM_MISMATCH_RATE": str(args.mismatch_rate),
+            "LLM_REQUESTS_PER_MINUTE": "1000000",
+            "LLM_TOKENS_PER_MINUTE": "1000000000",
+            "LLM_BACKOFF_BASE_SECONDS": "0.01",
+            # 2回目以降がキャッシュに当たると --repeat によって結果が変わってしまう
+            "LLM_CACHE_ENABLED": "false",
+            "PYTHONPATH": str(BACKEND_DIR),
+        }
+        command = [sys.executable, str(Path(__file__).resolve()), "--single", str(size),
+                   "--repeat", str(args.repeat), "--batch-size", str(args.batch_size)]
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            sys.stderr.write(completed.stdout[-4000:] + completed.stderr[-4000:])
+            raise SystemExit(f"benchmark for size {size} failed")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _print_table(results):
+    header = f"{'size':>8} {'comments/s':>11} {'p50 s':>8} {'p95 s':>8} {'LLM calls':>10} {'call p50 ms':>12} {'call p95 ms':>12} {'peak RSS MB':>12}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        call_p50 = (r["llm_call_p50_sec"] or 0) * 1000
+        call_p95 = (r["llm_call_p95_sec"] or 0) * 1000
+        print(f"{r['size']:>8} {r['throughput_comments_per_sec']:>11.1f} {r['end_to_end_p50_sec']:>8.2f} "
+              f"{r['end_to_end_p95_sec']:>8.2f} {r['llm_calls_per_run']:>10.0f} {call_p50:>12.1f} {call_p95:>12.1f} "
+              f"{r['peak_rss_mb']:>12.1f}")
+
+
+def _compare(results, baseline_path: Path, tolerance: float) -> bool:
+    """ベースラインより throughput が tolerance 以上落ちた、または LLM 呼び出し・メモリが増えたサイズを報告する。"""
+    baseline = {r["size"]: r for r in json.loads(baseline_path.read_text(encoding="utf-8"))}
+    ok = True
+    for r in results:
+        base = baseline.get(r["size"])
+        if base is None:
+            continue
+        checks = [
+            ("throughput", r["throughput_comments_per_sec"] < base["throughput_comments_per_sec"] * (1 - tolerance)),
+            ("LLM calls", r["llm_calls_per_run"] > base["llm_calls_per_run"] * (1 + tolerance)),
+            ("peak RSS", r["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance)),
+        ]
+        for name, regressed in checks:
+            if regressed:
+                ok = False
+                print(f"REGRESSION size={r['size']}: {name} is worse than baseline beyond {tolerance:.0%}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="カンマ区切りのコメント件数")
+    parser.add_argument("--repeat", type=int, default=1, help="サイズごとの繰り返し回数（p50/p95 の算出に使う）")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="フェイクLLMの1呼び出しあたりの遅延（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--mismatch-rate", type=float, default=0.0)
+    parser.add_argument("--output", type=Path, help="結果をJSONで保存するパス")
+    parser.add_argument("--baseline", type=Path, help="比較対象の結果JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="回帰とみなす劣化の割合")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        # 子プロセス側: 分析ログは標準エラーに逃がし、最後の行に結果のJSONだけを出力する
+        real_stdout = sys.stdout
+        sys.stdout = sys.stderr
+        result = run_single(args.single, args.repeat, args.batch_size)
+        real_stdout.write(json.dumps(result) + "\n")
+        return
+
+    results = [_run_in_subprocess(int(size), args) for size in args.sizes.split(",")]
+    _print_table(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.baseline and not _compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 # backend/main.py
 
-from fastapi import FastAPI
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from app.api.api_router import api_router
 from app.core.config import settings
+from app.core import metrics
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -22,6 +25,43 @@ app.add_middleware(
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+def _route_template(request: Request) -> str:
+    """
+    ラベルの種類が増えすぎないよう、実際のURLではなくパスパラメータを伏せたパス（/api/v1/jobs/{job_id} など）を返す。
+    どのルートにも一致しなかったリクエストはまとめて "unmatched" とする。
+    """
+    route = request.scope.get("route")
+    if route is None:
+        return "unmatched"
+    path = request.url.path
+    if route.path_regex.match(path):
+        return route.path
+    # FastAPI のバージョンによっては、include_router したルートの path にプレフィックスが含まれない。
+    # その場合はURLのうちルートのテンプレートに一致した末尾を除いた部分を、プレフィックスとして付け足す
+    for i, ch in enumerate(path):
+        if ch == "/" and route.path_regex.match(path[i:]):
+            return path[:i] + route.path
+    return route.path
+
+# エンドポイントごとのレイテンシを記録する
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.http_request_duration.observe(
+            time.perf_counter() - started, method=request.method, path=_route_template(request), status=str(status),
+        )
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Prometheus 形式のメトリクス"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"message": f"Welcome to {settings.PROJECT_NAME}"}
\ No newline at end of file
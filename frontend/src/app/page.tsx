@@ -26,18 +26,43 @@ interface ThemeInfo {
   representative_comment: string;
 }
 
+interface JobStatus {
+  job_id: string;
+  status: "queued" | "running" | "completed" | "failed" | "cancelled";
+  batches_completed: number;
+  batches_total: number;
+  eta_seconds: number | null;
+  error: string | null;
+}
+
 interface DashboardData {
   summary: {
     totalComments: number;
     positiveCount: number;
     negativeCount: number;
     neutralCount: number;
+    criticalCount: number;
   };
   categoryDistribution: { [key: string]: number };
   topPositiveThemes: ThemeInfo[];
   topNegativeThemes: ThemeInfo[];
   criticalComments: CommentInfo[];
   topRankedComments: CommentInfo[];
+  // 複数の列を合わせたダッシュボードには無い
+  resultId?: string;
+}
+
+// 複数の列をまとめて分析した結果
+interface MultiColumnResult {
+  columns: (DashboardData & { columnName: string })[];
+  combined: DashboardData;
+}
+
+interface CommentPage {
+  total: number;
+  page: number;
+  page_size: number;
+  items: CommentInfo[];
 }
 
 // ========== ダッシュボード用UIコンポーネント群 ==========
@@ -132,18 +157,58 @@ const ThemedComments = ({
 );
 
 // 4. 危険コメントのアラート
-const CriticalCommentsAlert = ({ comments }: { comments: CommentInfo[] }) => {
+// ダッシュボードには重要度の高い数件だけが含まれるので、残りは結果APIからページ単位で読み込む
+// バックエンドの CRITICAL_PREVIEW_COUNT と同じ件数にし、ダッシュボードの分をちょうど1ページ目とみなす
+const CRITICAL_PAGE_SIZE = 20;
+const CriticalCommentsAlert = ({
+  comments,
+  total,
+  resultId,
+}: {
+  comments: CommentInfo[];
+  total: number;
+  resultId?: string;
+}) => {
+  const [loaded, setLoaded] = useState<CommentInfo[] | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   if (!comments || comments.length === 0) return null;
+  const shown = loaded ?? comments;
+
+  const loadMore = async () => {
+    setIsLoadingMore(true);
+    try {
+      // ダッシュボードに含まれている分（先頭の1ページ）の続きから取得する
+      const page = Math.floor(shown.length / CRITICAL_PAGE_SIZE) + 1;
+      const response = await fetch(
+        `http://localhost:8000/api/v1/results/${resultId}/comments?is_critical=true&order_by=score&page=${page}&page_size=${CRITICAL_PAGE_SIZE}`
+      );
+      if (!response.ok) return;
+      const data: CommentPage = await response.json();
+      setLoaded((prev) => [...(prev ?? comments), ...data.items]);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   return (
     <div className="p-4 bg-red-100 border-l-4 border-red-500 text-red-800 rounded">
-      <h3 className="font-bold">🚨 要対応コメント ({comments.length}件)</h3>
+      <h3 className="font-bold">🚨 要対応コメント ({total}件)</h3>
       <ul className="list-disc list-inside mt-2 space-y-1">
-        {comments.map((comment, index) => (
+        {shown.map((comment, index) => (
           <li key={index} className="whitespace-pre-wrap">
             {comment.original_text}
           </li>
         ))}
       </ul>
+      {resultId && shown.length < total && (
+        <button
+          onClick={loadMore}
+          disabled={isLoadingMore}
+          className="mt-2 text-sm underline disabled:opacity-50"
+        >
+          {isLoadingMore ? "読み込み中..." : "さらに表示"}
+        </button>
+      )}
     </div>
   );
 };
@@ -173,14 +238,33 @@ export default function HomePage() {
   const [headers, setHeaders] = useState<string[]>([]);
   const [totalRows, setTotalRows] = useState(0);
   const [selectedColumn, setSelectedColumn] = useState<string>("");
+  // 同じ読み込み・同じLLMバッチでまとめて分析する追加の列
+  const [extraColumns, setExtraColumns] = useState<string[]>([]);
+  const additionalColumns = extraColumns.filter(
+    (column) => column !== selectedColumn
+  );
   const [batchSize, setBatchSize] = useState(50);
+  const [rowKeyColumn, setRowKeyColumn] = useState<string>("");
+  // 直前に完了した分析。次のアップロードをこの結果への差分として分析できる
+  const [previousRun, setPreviousRun] = useState<{
+    resultId: string;
+    rowKeyColumn: string;
+  } | null>(null);
+  const [updatePrevious, setUpdatePrevious] = useState(false);
   const [dashboardData, setDashboardData] = useState<DashboardData | null>(
     null
   );
+  // 複数の列を分析した場合の結果と、表示中の列（空文字は全列の合計）
+  const [multiResult, setMultiResult] = useState<MultiColumnResult | null>(
+    null
+  );
+  const [selectedView, setSelectedView] = useState<string>("");
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [reportText, setReportText] = useState<string>("");
   const [isReportLoading, setIsReportLoading] = useState(false);
+  const [jobStatus, setJobStatus] = useState<JobStatus | null>(null);
+  const [resultJobId, setResultJobId] = useState<string | null>(null);
 
   // --- コスト計算 ---
   const { estimatedCost, apiCallCount } = useMemo(() => {
@@ -190,9 +274,12 @@ export default function HomePage() {
     const totalTokens = totalRows * AVG_TOKENS_PER_COMMENT;
     const costInUSD =
       (totalTokens / 1_000_000) * GEMINI_FLASH_PRICE_PER_MILLION_TOKENS;
-    const calls = batchSize > 0 ? Math.ceil(totalRows / batchSize) : 0;
-    return { estimatedCost: costInUSD, apiCallCount: calls };
-  }, [totalRows, batchSize]);
+    // 複数の列のコメントは同じバッチに詰めて送られる
+    const columnCount = 1 + additionalColumns.length;
+    const calls =
+      batchSize > 0 ? Math.ceil((totalRows * columnCount) / batchSize) : 0;
+    return { estimatedCost: costInUSD * columnCount, apiCallCount: calls };
+  }, [totalRows, batchSize, additionalColumns.length]);
 
   // --- イベントハンドラ ---
   const handleFileChange = (event: ChangeEvent<HTMLInputElement>) => {
@@ -202,7 +289,10 @@ export default function HomePage() {
       setHeaders([]);
       setTotalRows(0);
       setSelectedColumn("");
+      setExtraColumns([]);
       setDashboardData(null);
+      setMultiResult(null);
+      setResultJobId(null);
       setError(null);
       setReportText("");
     }
@@ -230,24 +320,59 @@ export default function HomePage() {
     setIsLoading(true);
     setError(null);
     setDashboardData(null);
+    setMultiResult(null);
+    setSelectedView("");
+    setResultJobId(null);
     setReportText("");
+    setJobStatus(null);
     try {
-      const data = await startAnalysis(fileId, selectedColumn, batchSize);
-      setDashboardData(data);
+      const columns = [selectedColumn, ...additionalColumns];
+      // 差分分析は1つの列を分析する場合のみ
+      const incremental =
+        updatePrevious && previousRun !== null && columns.length === 1;
+      const keyColumn = incremental ? previousRun.rowKeyColumn : rowKeyColumn;
+      const jobId = await startAnalysis(fileId, columns, batchSize, {
+        rowKeyColumn: keyColumn,
+        baseResultId: incremental ? previousRun.resultId : null,
+      });
+      await waitForJob(jobId, setJobStatus);
+      const data = await getJobResult(jobId);
+      setResultJobId(jobId);
+      if ("columns" in data) {
+        setMultiResult(data);
+        setDashboardData(data.combined);
+      } else {
+        setDashboardData(data);
+        if (data.resultId) {
+          setPreviousRun({ resultId: data.resultId, rowKeyColumn: keyColumn });
+        }
+      }
     } catch (err: any) {
       setError(err.message);
     } finally {
       setIsLoading(false);
+      setJobStatus(null);
     }
   };
 
+  const handleCancel = async () => {
+    if (!jobStatus) return;
+    await fetch(
+      `http://localhost:8000/api/v1/jobs/${jobStatus.job_id}/cancel`,
+      { method: "POST" }
+    );
+  };
+
   const handleGenerateReport = async () => {
-    if (!dashboardData) return;
+    if (!resultJobId) return;
     setIsReportLoading(true);
     setError(null);
+    setReportText("");
     try {
-      const result = await getReport(dashboardData);
-      setReportText(result.report_text);
+      // 生成された断片から順に表示する
+      await streamReport(resultJobId, (text) =>
+        setReportText((prev) => prev + text)
+      );
     } catch (err: any) {
       setError(err.message);
     } finally {
@@ -273,40 +398,111 @@ export default function HomePage() {
   }
   async function startAnalysis(
     fileId: string,
-    columnName: string,
-    batchSize: number
-  ): Promise<DashboardData> {
+    columnNames: string[],
+    batchSize: number,
+    options: { rowKeyColumn: string; baseResultId: string | null }
+  ): Promise<string> {
     const response = await fetch("http://localhost:8000/api/v1/files/analyze", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({
         file_id: fileId,
-        column_name: columnName,
+        ...(columnNames.length > 1
+          ? { column_names: columnNames }
+          : { column_name: columnNames[0] }),
         batch_size: batchSize,
+        row_key_column: options.rowKeyColumn || null,
+        base_result_id: options.baseResultId,
       }),
     });
     if (!response.ok) {
       const err = await response.json();
       throw new Error(err.detail || "分析中にエラーが発生しました。");
     }
+    const { job_id } = await response.json();
+    return job_id;
+  }
+  // SSEでジョブの進捗を受け取り、終了したら resolve する
+  function waitForJob(
+    jobId: string,
+    onProgress: (status: JobStatus) => void
+  ): Promise<void> {
+    return new Promise((resolve, reject) => {
+      const source = new EventSource(
+        `http://localhost:8000/api/v1/jobs/${jobId}/events`
+      );
+      const handle = (event: MessageEvent) => {
+        const status: JobStatus = JSON.parse(event.data);
+        onProgress(status);
+        if (status.status === "completed") {
+          source.close();
+          resolve();
+        } else if (status.status === "failed") {
+          source.close();
+          reject(new Error(status.error || "分析中にエラーが発生しました。"));
+        } else if (status.status === "cancelled") {
+          source.close();
+          reject(new Error("分析はキャンセルされました。"));
+        }
+      };
+      ["progress", "completed", "failed", "cancelled"].forEach((name) =>
+        source.addEventListener(name, handle as EventListener)
+      );
+      source.onerror = () => {
+        source.close();
+        reject(new Error("進捗の取得中に接続が切断されました。"));
+      };
+    });
+  }
+  async function getJobResult(
+    jobId: string
+  ): Promise<DashboardData | MultiColumnResult> {
+    const response = await fetch(
+      `http://localhost:8000/api/v1/jobs/${jobId}/result`
+    );
+    if (!response.ok) {
+      const err = await response.json();
+      throw new Error(err.detail || "分析結果の取得に失敗しました。");
+    }
     return response.json();
   }
-  async function getReport(
-    data: DashboardData
-  ): Promise<{ report_text: string }> {
+  // レポートをSSEで受け取り、断片ごとに onChunk を呼ぶ（POSTのため EventSource ではなく fetch で読む）
+  async function streamReport(
+    jobId: string,
+    onChunk: (text: string) => void
+  ): Promise<void> {
     const response = await fetch(
-      "http://localhost:8000/api/v1/report/generate",
+      "http://localhost:8000/api/v1/report/stream",
       {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(data),
+        body: JSON.stringify({ job_id: jobId }),
       }
     );
-    if (!response.ok) {
+    if (!response.ok || !response.body) {
       const err = await response.json();
       throw new Error(err.detail || "レポート生成に失敗しました。");
     }
-    return response.json();
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) >= 0) {
+        const message = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        const event = message.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(message.match(/^data: (.*)$/m)?.[1] || "{}");
+        if (event === "chunk") {
+          onChunk(data.text);
+        } else if (event === "error") {
+          throw new Error(data.detail || "レポート生成に失敗しました。");
+        }
+      }
+    }
   }
 
   // --- レンダリング ---
@@ -358,6 +554,72 @@ export default function HomePage() {
               ))}
             </select>
           </div>
+          {headers.length > 1 && (
+            <div>
+              <p className="block text-sm font-medium">
+                同時に分析する列（任意）
+              </p>
+              <div className="mt-1 flex flex-wrap gap-x-4 gap-y-1">
+                {headers
+                  .filter((header) => header !== selectedColumn)
+                  .map((header, index) => (
+                    <label
+                      key={`extra-${header}-${index}`}
+                      className="flex items-center gap-1 text-sm"
+                    >
+                      <input
+                        type="checkbox"
+                        checked={extraColumns.includes(header)}
+                        onChange={(e) =>
+                          setExtraColumns((prev) =>
+                            e.target.checked
+                              ? [...prev, header]
+                              : prev.filter((column) => column !== header)
+                          )
+                        }
+                      />
+                      {header}
+                    </label>
+                  ))}
+              </div>
+            </div>
+          )}
+          <div>
+            <label
+              htmlFor="row-key-select"
+              className="block text-sm font-medium"
+            >
+              回答を識別する列（任意）
+            </label>
+            <select
+              id="row-key-select"
+              value={
+                updatePrevious && previousRun
+                  ? previousRun.rowKeyColumn
+                  : rowKeyColumn
+              }
+              onChange={(e) => setRowKeyColumn(e.target.value)}
+              disabled={updatePrevious && previousRun !== null}
+              className="mt-1 block w-full rounded-md border-gray-300 shadow-sm sm:text-sm"
+            >
+              <option value="">なし（コメント本文で識別）</option>
+              {headers.map((header, index) => (
+                <option key={`key-${header}-${index}`} value={header}>
+                  {header}
+                </option>
+              ))}
+            </select>
+          </div>
+          {previousRun && additionalColumns.length === 0 && (
+            <label className="flex items-center gap-2 text-sm">
+              <input
+                type="checkbox"
+                checked={updatePrevious}
+                onChange={(e) => setUpdatePrevious(e.target.checked)}
+              />
+              前回の分析結果を更新する（追加・変更された回答だけを分析します）
+            </label>
+          )}
           <div>
             <label htmlFor="batch-size" className="block text-sm font-medium">
               バッチサイズ
@@ -405,15 +667,56 @@ export default function HomePage() {
       {(isLoading || isReportLoading) && (
         <div className="text-center p-8">
           <p>処理中です... 少々お待ちください。</p>
+          {jobStatus && jobStatus.batches_total > 0 && (
+            <div className="mt-4 space-y-2">
+              <p className="text-sm text-gray-600">
+                バッチ {jobStatus.batches_completed} / {jobStatus.batches_total}
+                {jobStatus.eta_seconds !== null &&
+                  `（残り約 ${Math.ceil(jobStatus.eta_seconds)} 秒）`}
+              </p>
+              <button
+                onClick={handleCancel}
+                className="rounded-md bg-gray-200 px-3 py-1 text-sm enabled:hover:bg-gray-300"
+              >
+                キャンセル
+              </button>
+            </div>
+          )}
         </div>
       )}
 
       {dashboardData && !isLoading && (
         <div className="mt-8 space-y-8 p-6 bg-white rounded-lg shadow">
           <h2 className="text-2xl font-bold border-b pb-2">分析結果サマリー</h2>
+          {multiResult && (
+            <select
+              value={selectedView}
+              onChange={(e) => {
+                setSelectedView(e.target.value);
+                setDashboardData(
+                  multiResult.columns.find(
+                    (column) => column.columnName === e.target.value
+                  ) ?? multiResult.combined
+                );
+              }}
+              className="block w-full rounded-md border-gray-300 shadow-sm sm:text-sm"
+            >
+              <option value="">すべての列の合計</option>
+              {multiResult.columns.map((column) => (
+                <option key={column.columnName} value={column.columnName}>
+                  {column.columnName}
+                </option>
+              ))}
+            </select>
+          )}
           <OverallSummary data={dashboardData.summary} /> <hr />
           <CategoryPieChart data={dashboardData.categoryDistribution} /> <hr />
-          <CriticalCommentsAlert comments={dashboardData.criticalComments} />
+          <CriticalCommentsAlert
+            key={selectedView}
+            comments={dashboardData.criticalComments}
+            total={dashboardData.summary.criticalCount}
+            resultId={dashboardData.resultId}
+          />
           <div className="grid grid-cols-1 lg:grid-cols-2 gap-8">
             <ThemedComments
               title="👍 ポジティブなご意見の要点"